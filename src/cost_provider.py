@@ -0,0 +1,202 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import os
+import json
+import random
+import threading
+import time
+
+import scraper
+
+# Specify the path to your 'data' folder
+data_folder = 'data'
+
+# Random delay between two requests in seconds, shared by all workers, as in the bulk scraper
+request_delay: Tuple[float, float] = (3, 5)
+# Number of failed requests after which a leg is taken as missing for the rest of the run
+max_fetch_failures: int = 3
+
+
+class LazyCostProvider:
+    """
+    Provide one-way and round-trip costs to the optimizer, fetching real prices only when they are needed.
+
+    The cost dictionaries start from a cheap estimate for every unknown price: the lowest price fetched
+    so far for that kind of ticket, or zero if nothing has been fetched yet. Because the estimate is a
+    lower bound, routes using unknown legs look promising and the optimizer asks for their real prices.
+    Fetched prices are memoized to disk, so later runs only fetch the legs that were never needed before.
+    Requests are throttled to one per request_delay over all workers, and failed requests are not memoized,
+    so that they are fetched again instead of being taken for a missing flight. After max_fetch_failures
+    failed requests a leg is priced as missing for the rest of the run, but this is not memoized either.
+
+    Args:
+        cities (List[str]): The cities to provide costs between.
+        cache_file_path (str): The JSON file in which fetched prices are memoized.
+        max_workers (int): The number of prices fetched in parallel.
+    """
+
+    def __init__(self, cities: List[str], cache_file_path: str = os.path.join(data_folder, 'price_cache.json'),
+                 max_workers: int = 4):
+        self.cities = cities
+        self.cache_file_path = cache_file_path
+        self.max_workers = max_workers
+        self.throttle_lock = threading.Lock()
+        self.next_request_time: float = 0.0
+        self.fetched: Dict[str, Dict[str, Dict[str, int]]] = {'one_way': {}, 'round_trip': {}}
+        self.failures: Dict[Tuple[str, str, str], int] = {}
+        self.load_cache()
+
+        # Fill the cost dictionaries with the fetched prices and an estimate for the unknown ones
+        self.one_way_costs: Dict[str, Dict[str, int]] = self.build_costs('one_way')
+        self.round_trip_costs: Dict[str, Dict[str, int]] = self.build_costs('round_trip')
+
+    def load_cache(self) -> None:
+        """
+        Load the memoized prices, if they were fetched for the same travel dates.
+        """
+        if not os.path.exists(self.cache_file_path):
+            return
+        with open(self.cache_file_path, 'r') as f:
+            cache = json.load(f)
+        if cache.get('start_date') == scraper.start_date and cache.get('end_date') == scraper.end_date:
+            self.fetched = cache['prices']
+
+    def save_cache(self) -> None:
+        """
+        Memoize the fetched prices to disk.
+        """
+        cache_folder = os.path.dirname(self.cache_file_path)
+        if cache_folder and not os.path.exists(cache_folder):
+            os.makedirs(cache_folder)
+        cache = {'start_date': scraper.start_date, 'end_date': scraper.end_date, 'prices': self.fetched}
+        with open(self.cache_file_path, 'w') as f:
+            json.dump(cache, f, indent=4)
+
+    def estimate(self, kind: str) -> int:
+        """
+        Estimate an unknown price as the lowest price fetched so far for the same kind of ticket.
+
+        Args:
+            kind (str): 'one_way' or 'round_trip'.
+
+        Returns:
+            int: The estimated price.
+        """
+        prices = [price for destinations in self.fetched[kind].values() for price in destinations.values()
+                  if price != 9999]
+        return min(prices, default=0)
+
+    def build_costs(self, kind: str) -> Dict[str, Dict[str, int]]:
+        """
+        Build a cost dictionary from the fetched prices, estimating the unknown ones.
+
+        Args:
+            kind (str): 'one_way' or 'round_trip'.
+
+        Returns:
+            Dict[str, Dict[str, int]]: The costs between all cities.
+        """
+        estimate = self.estimate(kind)
+        costs: Dict[str, Dict[str, int]] = {}
+        for origin in self.cities:
+            costs[origin] = {}
+            for destination in self.cities:
+                if origin == destination:
+                    costs[origin][destination] = 9999
+                else:
+                    costs[origin][destination] = self.fetched[kind].get(origin, {}).get(destination, estimate)
+        return costs
+
+    def is_known(self, kind: str, origin: str, destination: str) -> bool:
+        """
+        Check whether the real price of a leg or round-trip ticket is known.
+
+        Args:
+            kind (str): 'one_way' or 'round_trip'.
+            origin (str): The departure city.
+            destination (str): The arrival city.
+
+        Returns:
+            bool: True if the price was fetched, the leg does not exist, or fetching it failed too often.
+        """
+        return self.has_price(kind, origin, destination) or self.failures.get((kind, origin, destination), 0) >= max_fetch_failures
+
+    def has_price(self, kind: str, origin: str, destination: str) -> bool:
+        """
+        Check whether the real price of a leg or round-trip ticket was fetched.
+
+        Args:
+            kind (str): 'one_way' or 'round_trip'.
+            origin (str): The departure city.
+            destination (str): The arrival city.
+
+        Returns:
+            bool: True if the price was fetched or the leg does not exist.
+        """
+        return origin == destination or destination in self.fetched[kind].get(origin, {})
+
+    def fetch_price(self, leg: Tuple[str, str, str]) -> Optional[int]:
+        """
+        Fetch the price of a leg or round-trip ticket, waiting until the throttle allows the next request.
+
+        Args:
+            leg (Tuple[str, str, str]): The key as ('one_way' or 'round_trip', departure, arrival).
+
+        Returns:
+            Optional[int]: The price, 9999 if no valid flight exists, or None if the request failed.
+        """
+        with self.throttle_lock:
+            request_time = max(time.time(), self.next_request_time)
+            self.next_request_time = request_time + random.uniform(*request_delay)
+        time.sleep(max(request_time - time.time(), 0))
+        kind, origin, destination = leg
+        return scraper.fetch_cheapest_price(origin, destination, round_trip=kind == 'round_trip')
+
+    def fetch(self, legs: Iterable[Tuple[str, str, str]]) -> Set[Tuple[str, str, str]]:
+        """
+        Fetch the real prices of the legs and round-trip tickets that are still unknown, in parallel.
+        The cost dictionaries are updated in place and the fetched prices are memoized to disk.
+        Legs whose request failed keep their estimate and are not memoized, until they failed
+        max_fetch_failures times and are priced as missing.
+
+        Args:
+            legs (Iterable[Tuple[str, str, str]]): Keys as ('one_way' or 'round_trip', departure, arrival).
+
+        Returns:
+            Set[Tuple[str, str, str]]: The legs and tickets whose prices changed.
+        """
+        unknown_legs = sorted({leg for leg in legs if not self.is_known(*leg)})
+        if not unknown_legs:
+            return set()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            prices = list(executor.map(self.fetch_price, unknown_legs))
+
+        fetched_legs = set()
+        for (kind, origin, destination), price in zip(unknown_legs, prices):
+            costs = self.one_way_costs if kind == 'one_way' else self.round_trip_costs
+            if price is None:
+                self.failures[kind, origin, destination] = self.failures.get((kind, origin, destination), 0) + 1
+                if self.failures[kind, origin, destination] >= max_fetch_failures:
+                    costs[origin][destination] = 9999
+                    fetched_legs.add((kind, origin, destination))
+                continue
+            self.fetched[kind].setdefault(origin, {})[destination] = price
+            costs[origin][destination] = price
+            fetched_legs.add((kind, origin, destination))
+
+        if any(self.has_price(*leg) for leg in fetched_legs):
+            self.save_cache()
+        return fetched_legs
+
+    def fetched_fraction(self) -> float:
+        """
+        Calculate the fraction of all ordered city pairs whose prices have been fetched.
+
+        Returns:
+            float: The fetched fraction over both one-way and round-trip tickets.
+        """
+        pairs = len(self.cities) * (len(self.cities) - 1)
+        fetched = sum(1 for kind in self.fetched for origin in self.cities for destination in self.cities
+                      if origin != destination and destination in self.fetched[kind].get(origin, {}))
+        return fetched / (2 * pairs) if pairs else 1.0
@@ -0,0 +1,302 @@
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple, Type
+import math
+import multiprocessing
+import random
+import sys
+import time
+
+from evaluator import RouteEvaluator
+
+
+class SharedIncumbent:
+    """
+    The best cost found by any engine of a portfolio, shared between processes.
+    Engines compare their search against it, and when an engine reaches the target cost, all engines are asked to stop.
+
+    Args:
+        target_cost (Optional[float]): The cost at which the search can stop, None to search until the time limit.
+    """
+
+    def __init__(self, target_cost: Optional[float] = None):
+        self.cost = multiprocessing.Value('d', float('inf'))
+        self.stop_event = multiprocessing.Event()
+        self.target_cost = target_cost
+
+    def offer(self, cost: float) -> None:
+        """
+        Offer the cost of a route, which becomes the incumbent if it is cheaper.
+
+        Args:
+            cost (float): The cost of the route.
+        """
+        with self.cost.get_lock():
+            if cost < self.cost.value:
+                self.cost.value = cost
+        if self.target_cost is not None and cost <= self.target_cost:
+            self.stop_event.set()
+
+    def best_cost(self) -> float:
+        """
+        Returns:
+            float: The best cost found by any engine.
+        """
+        return self.cost.value
+
+    def should_stop(self) -> bool:
+        """
+        Returns:
+            bool: True if an engine reached the target cost.
+        """
+        return self.stop_event.is_set()
+
+
+class SearchEngine:
+    """
+    Base class of the search engines. An engine searches for the cheapest route of the evaluator's instance
+    until the time limit is reached or the portfolio asks it to stop.
+
+    Args:
+        evaluator (RouteEvaluator): The shared evaluator.
+        time_limit (Optional[float]): The wall-clock time limit in seconds, None for no limit.
+        incumbent (Optional[SharedIncumbent]): The incumbent shared with the other engines of a portfolio.
+    """
+
+    name: str = ''
+
+    def __init__(self, evaluator: RouteEvaluator, time_limit: Optional[float] = None,
+                 incumbent: Optional[SharedIncumbent] = None):
+        self.evaluator = evaluator
+        self.time_limit = time_limit
+        self.incumbent = incumbent
+        self.best_route: Optional[List[str]] = None
+        self.best_cost: float = float('inf')
+        self.start_time: float = 0.0
+
+    def run(self) -> Tuple[Optional[List[str]], float]:
+        """
+        Run the search.
+
+        Returns:
+            Tuple[Optional[List[str]], float]: The best route found and its cost.
+        """
+        self.start_time = time.time()
+        self.search()
+        return self.best_route, self.best_cost
+
+    def search(self) -> None:
+        """
+        Search for routes, passing every evaluated route to consider() until should_stop() returns True.
+        """
+        raise NotImplementedError
+
+    def consider(self, route: List[str], cost: float) -> None:
+        """
+        Keep track of the best route and share its cost with the other engines.
+
+        Args:
+            route (List[str]): The evaluated route.
+            cost (float): The cost of the route.
+        """
+        if cost < self.best_cost:
+            self.best_cost = cost
+            self.best_route = route.copy()
+            if self.incumbent is not None:
+                self.incumbent.offer(cost)
+
+    def global_best_cost(self) -> float:
+        """
+        Returns:
+            float: The best cost found by this engine or any other engine of the portfolio.
+        """
+        if self.incumbent is None:
+            return self.best_cost
+        return min(self.best_cost, self.incumbent.best_cost())
+
+    def should_stop(self) -> bool:
+        """
+        Returns:
+            bool: True if the time limit is reached or an engine reached the target cost.
+        """
+        if self.time_limit is not None and time.time() - self.start_time >= self.time_limit:
+            return True
+        return self.incumbent is not None and self.incumbent.should_stop()
+
+
+def random_neighbour(route: List[str], evaluator: RouteEvaluator, max_attempts: int = 20) -> List[str]:
+    """
+    Generate a valid neighbour of a route by swapping two cities, reversing a segment,
+    inserting a mandatory or optional city, removing a city (excluding start and end),
+    or replacing the start or end by another origin or destination city.
+
+    Args:
+        route (List[str]): The route.
+        evaluator (RouteEvaluator): The evaluator that checks the constraints.
+        max_attempts (int): The number of moves tried before giving up.
+
+    Returns:
+        List[str]: A valid neighbour, or a copy of the route if no valid move was found.
+    """
+    cities = evaluator.mandatory_cities + evaluator.optional_cities
+    for _ in range(max_attempts):
+        neighbour = route.copy()
+        move = random.choice(['swap', 'reverse', 'insert', 'remove', 'endpoint'])
+        if move in ('swap', 'reverse') and len(route) >= 4:
+            idx1, idx2 = sorted(random.sample(range(1, len(route) - 1), 2))
+            if move == 'swap':
+                neighbour[idx1], neighbour[idx2] = neighbour[idx2], neighbour[idx1]
+            else:
+                neighbour[idx1:idx2 + 1] = reversed(neighbour[idx1:idx2 + 1])
+        elif move == 'insert':
+            neighbour.insert(random.randint(1, len(route) - 1), random.choice(cities))
+        elif move == 'remove' and len(route) > 3:
+            del neighbour[random.randint(1, len(route) - 2)]
+        elif move == 'endpoint' and (len(evaluator.origin_cities) > 1 or len(evaluator.destination_cities) > 1):
+            if random.random() < 0.5:
+                neighbour[0] = random.choice(evaluator.origin_cities)
+            else:
+                neighbour[-1] = random.choice(evaluator.destination_cities)
+        else:
+            continue
+        if evaluator.is_valid(neighbour):
+            return neighbour
+    return route.copy()
+
+
+class RandomSearchEngine(SearchEngine):
+    """
+    Evaluate independent random routes.
+    """
+
+    name = 'random'
+
+    def search(self) -> None:
+        while not self.should_stop():
+            route = self.evaluator.random_route()
+            self.consider(route, self.evaluator.cost(route))
+
+
+class SimulatedAnnealingEngine(SearchEngine):
+    """
+    Simulated annealing over random neighbours with geometric cooling.
+    When the temperature drops below the minimum, the search reheats from the best route found,
+    or from a random route if another engine of the portfolio already found a cheaper one.
+
+    Args:
+        initial_temperature (float): The starting temperature, in euros.
+        cooling_rate (float): The factor applied to the temperature after every move.
+        min_temperature (float): The temperature at which the search reheats.
+    """
+
+    name = 'annealing'
+
+    def __init__(self, evaluator: RouteEvaluator, time_limit: Optional[float] = None,
+                 incumbent: Optional[SharedIncumbent] = None, initial_temperature: float = 100.0,
+                 cooling_rate: float = 0.995, min_temperature: float = 1.0):
+        super().__init__(evaluator, time_limit, incumbent)
+        self.initial_temperature = initial_temperature
+        self.cooling_rate = cooling_rate
+        self.min_temperature = min_temperature
+
+    def search(self) -> None:
+        route = self.evaluator.random_route()
+        cost = self.evaluator.cost(route)
+        self.consider(route, cost)
+        temperature = self.initial_temperature
+
+        while not self.should_stop():
+            candidate = random_neighbour(route, self.evaluator)
+            candidate_cost = self.evaluator.cost(candidate)
+            if candidate_cost <= cost or random.random() < math.exp((cost - candidate_cost) / temperature):
+                route, cost = candidate, candidate_cost
+                self.consider(route, cost)
+
+            temperature *= self.cooling_rate
+            if temperature < self.min_temperature:
+                # Reheat from the best route found, unless another engine already beat it
+                temperature = self.initial_temperature
+                if self.best_cost > self.global_best_cost():
+                    route = self.evaluator.random_route()
+                    cost = self.evaluator.cost(route)
+                    self.consider(route, cost)
+                else:
+                    route, cost = self.best_route.copy(), self.best_cost
+
+
+class TabuSearchEngine(SearchEngine):
+    """
+    Tabu search that moves to the best sampled neighbour which was not visited recently,
+    unless it improves on the best route found by any engine of the portfolio (aspiration).
+
+    Args:
+        tabu_tenure (int): The number of recently visited routes that are tabu.
+        neighbourhood_size (int): The number of neighbours sampled per move.
+    """
+
+    name = 'tabu'
+
+    def __init__(self, evaluator: RouteEvaluator, time_limit: Optional[float] = None,
+                 incumbent: Optional[SharedIncumbent] = None, tabu_tenure: int = 20, neighbourhood_size: int = 30):
+        super().__init__(evaluator, time_limit, incumbent)
+        self.tabu_tenure = tabu_tenure
+        self.neighbourhood_size = neighbourhood_size
+
+    def search(self) -> None:
+        route = self.evaluator.random_route()
+        self.consider(route, self.evaluator.cost(route))
+        tabu_list: Deque[Tuple[str, ...]] = deque([tuple(route)], maxlen=self.tabu_tenure)
+
+        while not self.should_stop():
+            best_candidate, best_candidate_cost = None, float('inf')
+            for _ in range(self.neighbourhood_size):
+                candidate = random_neighbour(route, self.evaluator)
+                candidate_cost = self.evaluator.cost(candidate)
+                if tuple(candidate) in tabu_list and candidate_cost >= self.global_best_cost():
+                    continue
+                if candidate_cost < best_candidate_cost:
+                    best_candidate, best_candidate_cost = candidate, candidate_cost
+
+            if best_candidate is None:
+                # The whole sampled neighbourhood is tabu, diversify
+                best_candidate = self.evaluator.random_route()
+                best_candidate_cost = self.evaluator.cost(best_candidate)
+
+            route = best_candidate
+            tabu_list.append(tuple(route))
+            self.consider(route, best_candidate_cost)
+
+
+class MemeticEngine(SearchEngine):
+    """
+    The memetic algorithm of memetic_algorithm.py, run on the evaluator's instance until it has to stop.
+    """
+
+    name = 'memetic'
+
+    def search(self) -> None:
+        import memetic_algorithm
+
+        memetic_algorithm.one_way_costs = self.evaluator.one_way_costs
+        memetic_algorithm.round_trip_costs = self.evaluator.round_trip_costs
+        memetic_algorithm.origin_cities = self.evaluator.origin_cities
+        memetic_algorithm.destination_cities = self.evaluator.destination_cities
+        memetic_algorithm.mandatory_cities = self.evaluator.mandatory_cities
+        memetic_algorithm.optional_cities = self.evaluator.optional_cities
+        memetic_algorithm.successors = self.evaluator.successors
+        memetic_algorithm.available_round_trips = self.evaluator.round_trips
+        memetic_algorithm.best_cost = float('inf')
+        memetic_algorithm.best_route = None
+        memetic_algorithm.best_flights = None
+
+        def should_stop() -> bool:
+            self.consider(memetic_algorithm.best_route, memetic_algorithm.best_cost)
+            return self.should_stop()
+
+        memetic_algorithm.run_genetic_algorithm(num_generations=sys.maxsize, should_stop=should_stop, verbose=False)
+        self.consider(memetic_algorithm.best_route, memetic_algorithm.best_cost)
+
+
+ENGINES: Dict[str, Type[SearchEngine]] = {
+    engine.name: engine
+    for engine in (MemeticEngine, SimulatedAnnealingEngine, TabuSearchEngine, RandomSearchEngine)
+}
@@ -0,0 +1,403 @@
+from collections import Counter
+from typing import Dict, List, Optional, Set, Tuple
+import random
+
+missing_price: int = 9999  # Price of flights that don't exist or could not be scraped
+
+
+def build_adjacency(one_way_costs: Dict[str, Dict[str, int]],
+                    round_trip_costs: Dict[str, Dict[str, int]]) -> Tuple[Dict[str, Set[str]], Set[Tuple[str, str]]]:
+    """
+    Build the sparse adjacency of the flight network: the cities that can be flown to one-way from each city,
+    and the round-trip tickets that can be bought. A leg that only exists as half of a round-trip ticket
+    is not a successor, since it can only be flown as part of the out-and-back pattern of the ticket.
+
+    Args:
+        one_way_costs (Dict[str, Dict[str, int]]): The one-way costs per departure and arrival city.
+        round_trip_costs (Dict[str, Dict[str, int]]): The round-trip costs per departure and arrival city.
+
+    Returns:
+        Tuple[Dict[str, Set[str]], Set[Tuple[str, str]]]: The one-way successors per city and the available
+            round-trip tickets as (departure, arrival).
+    """
+    round_trips = {(departure, arrival) for departure, arrivals in round_trip_costs.items()
+                   for arrival, price in arrivals.items() if price < missing_price and departure != arrival}
+    successors: Dict[str, Set[str]] = {city: set() for city in set(one_way_costs) | set(round_trip_costs)}
+    for departure, arrivals in one_way_costs.items():
+        successors[departure].update(arrival for arrival, price in arrivals.items()
+                                     if price < missing_price and departure != arrival)
+    return successors, round_trips
+
+
+def round_trip_legs(route: List[str], round_trips: Set[Tuple[str, str]]) -> Set[Tuple[str, str]]:
+    """
+    Find the legs of a route that are covered by an available round-trip ticket,
+    using the same out-and-back pattern as find_round_trip_options.
+
+    Args:
+        route (List[str]): The route to analyze.
+        round_trips (Set[Tuple[str, str]]): The available round-trip tickets as (departure, arrival).
+
+    Returns:
+        Set[Tuple[str, str]]: The covered legs as (departure, arrival).
+    """
+    legs: Set[Tuple[str, str]] = set()
+    for i, departure_city in enumerate(route[:-1]):
+        try:
+            next_index = route.index(departure_city, i + 1)
+        except ValueError:
+            continue
+        arrival_city = route[i + 1]
+        if arrival_city == route[next_index - 1] and (departure_city, arrival_city) in round_trips:
+            legs.update([(departure_city, arrival_city), (arrival_city, departure_city)])
+    return legs
+
+
+def is_feasible_route(route: List[str], successors: Optional[Dict[str, Set[str]]],
+                      round_trips: Optional[Set[Tuple[str, str]]] = None) -> bool:
+    """
+    Check if every leg of a route exists, either as a one-way flight or covered by a round-trip ticket.
+
+    Args:
+        route (List[str]): The route to check.
+        successors (Optional[Dict[str, Set[str]]]): The one-way successors per city, None to consider every leg feasible.
+        round_trips (Optional[Set[Tuple[str, str]]]): The available round-trip tickets, None if only one-way legs count.
+
+    Returns:
+        bool: True if the route can be flown.
+    """
+    if successors is None:
+        return True
+    legs = [(route[i], route[i + 1]) for i in range(len(route) - 1)]
+    one_way_feasible = all(arrival in successors.get(departure, ()) for departure, arrival in legs)
+    if one_way_feasible or not round_trips:
+        return one_way_feasible
+    covered_legs = round_trip_legs(route, round_trips)
+    return all(arrival in successors.get(departure, ()) or (departure, arrival) in covered_legs
+               for departure, arrival in legs)
+
+
+def generate_random_route(origin_cities: List[str], destination_cities: List[str], mandatory_cities: List[str],
+                          optional_cities: List[str], successors: Optional[Dict[str, Set[str]]] = None,
+                          round_trips: Optional[Set[Tuple[str, str]]] = None) -> List[str]:
+    """
+    Generate a random valid route starting at one of the origin cities and ending at one of the destination cities.
+    Each mandatory and optional city appears twice in the pool.
+    Once all mandatory cities are picked at least once, and at least one optional city is picked,
+    a destination city is added to the pool. When a destination city is picked from the pool, the route ends.
+
+    If successors are given, only cities that can be flown to from the current city are picked. A leg that only
+    exists as either half of a round-trip ticket can be flown on, but the route only ends once every such leg is
+    covered by the ticket's out-and-back pattern. When the route runs into a dead end, the search backtracks to
+    the last city that had other options, remembering the dead ends so that each is explored only once.
+    A search that takes too long is restarted from scratch with a larger budget.
+
+    Args:
+        origin_cities (List[str]): The cities where the route can start.
+        destination_cities (List[str]): The cities where the route can end.
+        mandatory_cities (List[str]): The cities that have to be visited.
+        optional_cities (List[str]): The cities of which at least one has to be visited.
+        successors (Optional[Dict[str, Set[str]]]): The one-way successors per city, None to allow every leg.
+        round_trips (Optional[Set[Tuple[str, str]]]): The available round-trip tickets, None to fly one-way only.
+
+    Returns:
+        List[str]: A valid route.
+
+    Raises:
+        ValueError: If no valid route can be flown.
+    """
+    round_trips = round_trips or set()
+    remaining = Counter(mandatory_cities * 2 + optional_cities * 2)
+    dead_ends: Set[tuple] = set()
+    nodes_left = 0
+
+    def can_fly(route: List[str], city: str) -> bool:
+        departure = route[-1]
+        return (successors is None or city in successors.get(departure, ())
+                or (departure, city) in round_trips or (city, departure) in round_trips)
+
+    def is_satisfied() -> bool:
+        return (all(remaining[city] < 2 for city in mandatory_cities)
+                and any(remaining[city] < 2 for city in optional_cities))
+
+    def extend(route: List[str], end_tokens: int) -> Optional[List[str]]:
+        nonlocal nodes_left
+        state = route_state(route, remaining, successors, round_trips)
+        if state in dead_ends or nodes_left <= 0:
+            return None
+        # A leg that still has to be covered needs a later visit of the ticket's departure city,
+        # right after a visit of its arrival city
+        for departure, arrival in state[-1]:
+            if not any(ticket in round_trips and (remaining[ticket[0]] > 0 or ticket[0] in destination_cities)
+                       and (remaining[ticket[1]] > 0 or route[-1] == ticket[1])
+                       for ticket in ((departure, arrival), (arrival, departure))):
+                dead_ends.add(state)
+                return None
+        nodes_left -= 1
+
+        # Try the pool entries in random order, which picks them with the same odds as drawing from the pool
+        entries: List[Optional[str]] = [city for city, count in remaining.items() for _ in range(count)]
+        entries += [None] * end_tokens
+        random.shuffle(entries)
+        for city in dict.fromkeys(entries):
+            if city is None:
+                # A destination city, which ends the route
+                for destination in random.sample(destination_cities, len(destination_cities)):
+                    if can_fly(route, destination) and is_feasible_route(route + [destination], successors, round_trips):
+                        return route + [destination]
+                continue
+            if not can_fly(route, city):
+                continue
+            remaining[city] -= 1
+            extended_route = extend(route + [city], end_tokens + is_satisfied())
+            remaining[city] += 1
+            if extended_route is not None:
+                return extended_route
+
+        # Only a search that was not cut short proves that the partial route can't be completed
+        if nodes_left > 0:
+            dead_ends.add(state)
+        return None
+
+    # Restart with a doubled budget of partial routes whenever the search was cut short,
+    # since an unlucky first choice can otherwise take very long to backtrack out of
+    budget = 100
+    while True:
+        cut_short = False
+        for origin in random.sample(origin_cities, len(origin_cities)):
+            nodes_left = budget
+            route = extend([origin], 0)
+            if route is not None:
+                return route
+            cut_short = cut_short or nodes_left <= 0
+        if not cut_short:
+            raise ValueError("No valid route can be flown with the available flights")
+        budget *= 2
+
+
+def route_state(route: List[str], remaining: Counter, successors: Optional[Dict[str, Set[str]]],
+                round_trips: Set[Tuple[str, str]]) -> tuple:
+    """
+    Summarize a partial route by everything that decides how it can be completed: the current city, the cities
+    left in the pool, the round-trip tickets whose out-and-back pattern can still be completed, and the legs
+    that are covered, or still have to be covered, by a round-trip ticket.
+
+    Args:
+        route (List[str]): The partial route.
+        remaining (Counter): The number of times each city can still be picked.
+        successors (Optional[Dict[str, Set[str]]]): The one-way successors per city.
+        round_trips (Set[Tuple[str, str]]): The available round-trip tickets.
+
+    Returns:
+        tuple: The state of the partial route.
+    """
+    # The city after the last visit of each city, whose pattern is completed by its next visit
+    open_tickets = {city: route[i + 1] for i, city in enumerate(route[:-1])}
+    open_tickets = frozenset((city, arrival) for city, arrival in open_tickets.items()
+                             if city != route[-1] and (city, arrival) in round_trips)
+    covered_legs = round_trip_legs(route, round_trips)
+    uncovered_legs = frozenset((route[i], route[i + 1]) for i in range(len(route) - 1)
+                               if successors is not None and route[i + 1] not in successors.get(route[i], ())
+                               and (route[i], route[i + 1]) not in covered_legs)
+    return route[-1], frozenset((+remaining).items()), open_tickets, frozenset(covered_legs), uncovered_legs
+
+
+def is_valid_route(route: List[str], origin_cities: List[str], destination_cities: List[str],
+                   mandatory_cities: List[str], optional_cities: List[str]) -> bool:
+    """
+    Check if a route meets the constraints:
+    - Starts with an origin city and ends with a destination city
+    - Only mandatory and optional cities are visited in between, each at most twice
+    - All mandatory cities are included at least once
+    - At least one optional city is included
+
+    Args:
+        route (List[str]): The route to check.
+        origin_cities (List[str]): The cities where the route can start.
+        destination_cities (List[str]): The cities where the route can end.
+        mandatory_cities (List[str]): The cities that have to be visited.
+        optional_cities (List[str]): The cities of which at least one has to be visited.
+
+    Returns:
+        bool: True if the route is valid.
+    """
+    if len(route) < 3 or route[0] not in origin_cities or route[-1] not in destination_cities:
+        return False
+    city_counts = Counter(route[1:-1])
+    if any(city not in mandatory_cities and city not in optional_cities for city in city_counts):
+        return False
+    if any(count > 2 for count in city_counts.values()):
+        return False
+    if not all(city in city_counts for city in mandatory_cities):
+        return False
+    return any(city in city_counts for city in optional_cities)
+
+
+def find_round_trip_options(route: List[str], round_trip_costs: Dict[str, Dict[str, int]],
+                            available_only: bool = True) -> List[Tuple[str, str]]:
+    """
+    Find possible round-trip tickets in the route.
+    A round-trip is identified when a departure city appears twice in the route,
+    and the cities immediately after the first occurrence and immediately before
+    the second occurrence are the same arrival city.
+
+    Args:
+        route (List[str]): The route to analyze.
+        round_trip_costs (Dict[str, Dict[str, int]]): The round-trip costs per departure and arrival city.
+        available_only (bool): Whether to skip round-trip tickets that can't be bought.
+
+    Returns:
+        List[Tuple[str, str]]: A list of possible round-trip tickets as (departure, arrival).
+    """
+    options: List[Tuple[str, str]] = []
+    route_length = len(route)
+    for i, departure_city in enumerate(route):
+        # Only consider valid departure cities for round-trip tickets
+        if departure_city not in round_trip_costs:
+            continue
+        # Find the next occurrence of the departure city
+        try:
+            next_index = route.index(departure_city, i + 1)
+        except ValueError:
+            continue  # No second occurrence found
+        # Ensure indices are within bounds
+        if i + 1 >= route_length or next_index - 1 < 0:
+            continue
+        arrival_city_first = route[i + 1]
+        arrival_city_second = route[next_index - 1]
+        # Check if the arrival cities are the same and valid
+        if arrival_city_first == arrival_city_second and arrival_city_first in round_trip_costs[departure_city]:
+            if available_only and round_trip_costs[departure_city][arrival_city_first] >= missing_price:
+                continue
+            options.append((departure_city, arrival_city_first))
+    # Remove duplicates
+    options = list(set(options))
+    return options
+
+
+def calculate_cost(route: List[str], one_way_costs: Dict[str, Dict[str, int]],
+                   round_trip_costs: Dict[str, Dict[str, int]]) -> Tuple[int, List[Tuple[str, str, str, int]]]:
+    """
+    Calculate the total cost of the route, considering possible round-trip tickets.
+
+    Args:
+        route (List[str]): The route to calculate the cost for.
+        one_way_costs (Dict[str, Dict[str, int]]): The one-way costs per departure and arrival city.
+        round_trip_costs (Dict[str, Dict[str, int]]): The round-trip costs per departure and arrival city.
+
+    Returns:
+        Tuple[int, List[Tuple[str, str, str, int]]]: The total cost and flight details.
+    """
+    total_cost = 0
+    flights = []
+
+    # Create list of legs in the route
+    legs = [(route[i], route[i + 1]) for i in range(len(route) - 1)]
+
+    # Initialize leg coverage
+    leg_covered = set()
+
+    # Find round-trip options using the updated method
+    round_trip_options = find_round_trip_options(route, round_trip_costs)
+
+    # For each identified round-trip option, cover the corresponding legs
+    for departure, arrival in round_trip_options:
+        leg1 = (departure, arrival)
+        leg2 = (arrival, departure)
+        # Purchase the round-trip ticket
+        total_cost += round_trip_costs[departure][arrival]
+        # Mark legs as covered
+        leg_covered.update([leg1, leg2])
+        # Add flights with zero cost for legs covered by round-trip ticket
+        flights.append((leg1[0], leg1[1], 'Round-trip leg (no additional cost)', 0))
+        flights.append((leg2[0], leg2[1], 'Round-trip leg (no additional cost)', 0))
+
+    # Cover remaining legs with one-way tickets
+    for leg in legs:
+        if leg not in leg_covered:
+            departure, arrival = leg
+            cost = one_way_costs[departure][arrival]
+            total_cost += cost
+            flights.append((departure, arrival, 'One-way flight', cost))
+
+    return total_cost, flights
+
+
+class RouteEvaluator:
+    """
+    Shared evaluator for all search engines: the flight costs of an instance together with its constraints.
+
+    Args:
+        one_way_costs (Dict[str, Dict[str, int]]): The one-way costs per departure and arrival city.
+        round_trip_costs (Dict[str, Dict[str, int]]): The round-trip costs per departure and arrival city.
+        origin_cities (List[str]): The cities where the route can start.
+        destination_cities (List[str]): The cities where the route can end.
+        mandatory_cities (List[str]): The cities that have to be visited.
+        optional_cities (List[str]): The cities of which at least one has to be visited.
+        adjacency (Optional[Tuple[Dict[str, Set[str]], Set[Tuple[str, str]]]]): The adjacency of the costs
+            built by build_adjacency, built from the costs if None.
+    """
+
+    def __init__(self, one_way_costs: Dict[str, Dict[str, int]], round_trip_costs: Dict[str, Dict[str, int]],
+                 origin_cities: List[str], destination_cities: List[str], mandatory_cities: List[str],
+                 optional_cities: List[str],
+                 adjacency: Optional[Tuple[Dict[str, Set[str]], Set[Tuple[str, str]]]] = None):
+        self.one_way_costs = one_way_costs
+        self.round_trip_costs = round_trip_costs
+        self.origin_cities = origin_cities
+        self.destination_cities = destination_cities
+        self.mandatory_cities = mandatory_cities
+        self.optional_cities = optional_cities
+        self.successors, self.round_trips = adjacency or build_adjacency(one_way_costs, round_trip_costs)
+        self.evaluations = 0
+
+    def cost(self, route: List[str]) -> int:
+        """
+        Calculate the total cost of a route.
+
+        Args:
+            route (List[str]): The route to calculate the cost for.
+
+        Returns:
+            int: The total cost.
+        """
+        self.evaluations += 1
+        total_cost, _ = calculate_cost(route, self.one_way_costs, self.round_trip_costs)
+        return total_cost
+
+    def flights(self, route: List[str]) -> List[Tuple[str, str, str, int]]:
+        """
+        Find the flight details of a route.
+
+        Args:
+            route (List[str]): The route.
+
+        Returns:
+            List[Tuple[str, str, str, int]]: The flight details.
+        """
+        _, flights = calculate_cost(route, self.one_way_costs, self.round_trip_costs)
+        return flights
+
+    def is_valid(self, route: List[str]) -> bool:
+        """
+        Check if a route meets the constraints of the instance and all of its flights exist.
+
+        Args:
+            route (List[str]): The route to check.
+
+        Returns:
+            bool: True if the route is valid.
+        """
+        return (is_valid_route(route, self.origin_cities, self.destination_cities, self.mandatory_cities,
+                               self.optional_cities)
+                and is_feasible_route(route, self.successors, self.round_trips))
+
+    def random_route(self) -> List[str]:
+        """
+        Generate a random valid route.
+
+        Returns:
+            List[str]: A valid route.
+        """
+        return generate_random_route(self.origin_cities, self.destination_cities, self.mandatory_cities,
+                                     self.optional_cities, self.successors, self.round_trips)
@@ -0,0 +1,147 @@
+from contextlib import closing
+from typing import Dict, List, Optional, Tuple
+import os
+import sqlite3
+
+# Specify the path to your 'data' folder
+data_folder = 'data'
+flight_store_path: str = os.path.join(data_folder, 'flights.db')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS flights (
+    origin TEXT NOT NULL,
+    destination TEXT NOT NULL,
+    round_trip INTEGER NOT NULL,
+    departure_date TEXT NOT NULL,
+    return_date TEXT,
+    price REAL NOT NULL,
+    layovers INTEGER NOT NULL,
+    duration_minutes INTEGER NOT NULL,
+    departure_minutes INTEGER NOT NULL
+);
+DROP INDEX IF EXISTS flights_by_route;
+CREATE INDEX IF NOT EXISTS flights_by_route_and_dates ON flights (
+    round_trip, departure_date, return_date, origin, destination, layovers, duration_minutes, departure_minutes, price
+);
+"""
+
+
+def connect(db_path: str = flight_store_path) -> sqlite3.Connection:
+    """
+    Open the flight store, creating the database and its index if needed.
+
+    Args:
+        db_path (str): The path of the SQLite database.
+
+    Returns:
+        sqlite3.Connection: The connection to the flight store.
+    """
+    db_folder = os.path.dirname(db_path)
+    if db_folder and not os.path.exists(db_folder):
+        os.makedirs(db_folder)
+    connection = sqlite3.connect(db_path, timeout=30)
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def store_flights(origin: str, destination: str, round_trip: bool, departure_date: str,
+                  return_date: Optional[str], flights: List[dict], db_path: str = flight_store_path) -> None:
+    """
+    Store every parsed flight for a route and its dates, replacing the flights of an earlier scrape of the same dates.
+
+    Args:
+        origin (str): The departure city.
+        destination (str): The arrival city.
+        round_trip (bool): Whether the flights are round-trip tickets.
+        departure_date (str): The departure date as YYYY-MM-DD.
+        return_date (Optional[str]): The return date of round-trip tickets.
+        flights (List[dict]): The parsed flights, as returned by scraper.parse_flights.
+        db_path (str): The path of the SQLite database.
+    """
+    with closing(connect(db_path)) as connection, connection:
+        connection.execute(
+            "DELETE FROM flights WHERE round_trip = ? AND departure_date = ? AND return_date IS ? "
+            "AND origin = ? AND destination = ?",
+            (int(round_trip), departure_date, return_date, origin, destination))
+        connection.executemany(
+            "INSERT INTO flights VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(origin, destination, int(round_trip), departure_date, return_date, flight['price'],
+              flight['layovers'], flight['duration_minutes'], flight['departure_minutes']) for flight in flights])
+
+
+def query_costs(round_trip: bool, departure_date: Optional[str] = None, return_date: Optional[str] = None,
+                max_layovers: int = 1,
+                max_duration_minutes: int = 20 * 60, earliest_departure_minutes: int = 7 * 60,
+                min_price: float = 25, db_path: str = flight_store_path) -> Dict[Tuple[str, str], int]:
+    """
+    Query the cheapest flight per route that satisfies the filters.
+
+    Args:
+        round_trip (bool): Whether to query round-trip tickets instead of one-way flights.
+        departure_date (Optional[str]): The departure date as YYYY-MM-DD, any date if None.
+        return_date (Optional[str]): The return date of round-trip tickets as YYYY-MM-DD, any date if None.
+            Ignored for one-way flights.
+        max_layovers (int): The maximum number of layovers.
+        max_duration_minutes (int): The total travel duration must be shorter than this.
+        earliest_departure_minutes (int): The earliest local departure time, in minutes after midnight.
+        min_price (float): Cheaper prices are considered a mistake.
+        db_path (str): The path of the SQLite database.
+
+    Returns:
+        Dict[Tuple[str, str], int]: The cheapest price per (origin, destination).
+    """
+    query = ("SELECT origin, destination, MIN(price) FROM flights "
+             "WHERE round_trip = ? AND layovers <= ? AND duration_minutes < ? AND departure_minutes >= ? AND price >= ?")
+    parameters: list = [int(round_trip), max_layovers, max_duration_minutes, earliest_departure_minutes, min_price]
+    if departure_date is not None:
+        query += " AND departure_date = ?"
+        parameters.append(departure_date)
+    if return_date is not None and round_trip:
+        query += " AND return_date = ?"
+        parameters.append(return_date)
+    query += " GROUP BY origin, destination"
+
+    with closing(connect(db_path)) as connection:
+        return {(origin, destination): int(price)
+                for origin, destination, price in connection.execute(query, parameters)}
+
+
+def query_cities(db_path: str = flight_store_path) -> List[str]:
+    """
+    Query all cities in the flight store.
+
+    Args:
+        db_path (str): The path of the SQLite database.
+
+    Returns:
+        List[str]: The cities, sorted alphabetically.
+    """
+    with closing(connect(db_path)) as connection:
+        rows = connection.execute("SELECT origin FROM flights UNION SELECT destination FROM flights ORDER BY 1")
+        return [city for city, in rows]
+
+
+def build_cost_matrices(cities: Optional[List[str]] = None, db_path: str = flight_store_path,
+                        **filters) -> Tuple[Dict[str, Dict[str, int]], Dict[str, Dict[str, int]]]:
+    """
+    Build the one-way and round-trip cost dictionaries from the flight store.
+    Routes without a flight that satisfies the filters get a price of 9999.
+
+    Args:
+        cities (Optional[List[str]]): The cities to include, all cities in the store if None.
+        db_path (str): The path of the SQLite database.
+        **filters: The filters passed to query_costs.
+
+    Returns:
+        Tuple[Dict[str, Dict[str, int]], Dict[str, Dict[str, int]]]: The one-way and round-trip costs.
+    """
+    if cities is None:
+        cities = query_cities(db_path)
+
+    cost_matrices = []
+    for round_trip in (False, True):
+        prices = query_costs(round_trip, db_path=db_path, **filters)
+        cost_matrices.append({origin: {destination: prices.get((origin, destination), 9999) for destination in cities}
+                              for origin in cities})
+    one_way_costs, round_trip_costs = cost_matrices
+    return one_way_costs, round_trip_costs
@@ -1,38 +1,37 @@
 import random
-from collections import Counter
-from typing import List, Tuple
+from collections import Counter, defaultdict
+from typing import Callable, Dict, List, Optional, Set, Tuple
+import argparse
+import gzip
+import itertools
 import os
 import json
+import pickle
+import tempfile
+import time
+
+import evaluator
+from operator_selection import AdaptiveOperatorSelection
 
 # Specify the path to your 'data' folder
 data_folder = 'data'
 
-# Load the one_way_costs dictionary from the JSON file
-# This should be a dictionary of dictionaries, where the upper level contains origins and the nested dictionaries contain destinations
-one_way_file_path = os.path.join(data_folder, 'one_way_costs.json')
-with open(one_way_file_path, 'r') as f:
-    one_way_costs = json.load(f)
-
-# Load the round_trip_costs_AMS dictionary from the JSON file
-round_trip_file_path = os.path.join(data_folder, 'round_trip_costs.json')
-with open(round_trip_file_path, 'r') as f:
-    round_trip_costs = json.load(f)
-
-# Now you can use the dictionaries in your script
-print("Loaded one_way_costs:")
-print(one_way_costs)
-
-print("\nLoaded round_trip_costs:")
-print(round_trip_costs)
+# Flight costs, loaded by load_costs() or provided lazily by a LazyCostProvider
+# These are dictionaries of dictionaries, where the upper level contains origins and the nested dictionaries contain destinations
+one_way_costs: Dict[str, Dict[str, int]] = {}
+round_trip_costs: Dict[str, Dict[str, int]] = {}
+cities: List[str] = []
 
-
-# Define the cities
-cities = list(round_trip_costs.keys())
+# Sparse adjacency of the flight network, built by update_adjacency() whenever the costs change
+successors: Optional[Dict[str, Set[str]]] = None
+available_round_trips: Set[Tuple[str, str]] = set()
 
 # Mandatory and optional cities
 mandatory_cities: List[str] = ['SIN', 'TPE']
 optional_cities: List[str] = ['SGN', 'HAN']
-start_city: str = 'AMS'
+# Cities where the trip can start and end, several of each allow open-jaw trips in a single run
+origin_cities: List[str] = ['AMS']
+destination_cities: List[str] = ['AMS']
 
 # Memetic Algorithm Parameters
 population_size: int = 100 # Increased population size
@@ -41,41 +40,157 @@ mutation_rate: float = 0.3  # Increased mutation rate
 tournament_size: int = 3  # Adjusted tournament size
 elitism_count: int = 0  # Number of elites to preserve
 
-def generate_random_route() -> List[str]:
+# Warm-start Parameters
+state_file_path: str = os.path.join(data_folder, 'ga_state.json')
+warm_start_generations: int = 10  # Short budget when re-optimizing after a price refresh
+best_routes_count: int = 10  # Number of distinct best routes stored with the final population
+
+# Checkpoint Parameters
+checkpoint_file_path: str = os.path.join(data_folder, 'ga_checkpoint.pkl.gz')
+checkpoint_every_generations: int = 10
+checkpoint_every_seconds: float = 300
+
+# Lazy Price Fetching Parameters
+cost_provider = None  # LazyCostProvider that fetches prices on demand instead of loading them
+lazy_fetch_count: int = 10  # Number of best routes per generation whose unknown prices are fetched
+
+# Adaptive Operator Selection Parameters
+adaptive_operators: bool = True  # Adapt the operator probabilities to their improvement per CPU second
+deterministic_operators: bool = False  # Adapt to the improvement per route evaluation, so resumed runs adapt identically
+operator_probabilities: Dict[str, float] = {
+    'crossover': 1.0,
+    'mutate_remove': mutation_rate * 0.75,
+    'mutate_add': mutation_rate * 0.25,
+    'mutate_endpoints': mutation_rate * 0.25,  # Only used with several origin or destination cities
+    'local_search': 1.0,
+}
+evaluation_count: int = 0  # Number of calculate_cost calls, the effort unit of deterministic operator credit
+
+
+def load_costs() -> None:
     """
-    Generate a random valid route starting and ending at the start city.
-    Each mandatory and optional city appears twice in the pool.
-    Once all mandatory cities are picked at least once, and at least one optional city is picked,
-    the start city is added to the pool. When the start city is picked, the route ends.
+    Load the one-way and round-trip costs from the JSON files in the data folder.
+    """
+    global one_way_costs, round_trip_costs, cities
+
+    # Load the one_way_costs dictionary from the JSON file
+    one_way_file_path = os.path.join(data_folder, 'one_way_costs.json')
+    with open(one_way_file_path, 'r') as f:
+        one_way_costs = json.load(f)
+
+    # Load the round_trip_costs dictionary from the JSON file
+    round_trip_file_path = os.path.join(data_folder, 'round_trip_costs.json')
+    with open(round_trip_file_path, 'r') as f:
+        round_trip_costs = json.load(f)
+
+    # Define the cities
+    cities = list(round_trip_costs.keys())
+    update_adjacency()
+    print(f"Loaded one-way and round-trip costs between {len(cities)} cities")
+
+
+def load_costs_from_store(db_path: str, **filters) -> None:
+    """
+    Build the one-way and round-trip costs with an indexed query on the flight store.
+
+    Args:
+        db_path (str): The path of the SQLite flight store written by the scraper.
+        **filters: The flight filters, see flight_store.query_costs.
+    """
+    global one_way_costs, round_trip_costs, cities
+    import flight_store
+
+    one_way_costs, round_trip_costs = flight_store.build_cost_matrices(db_path=db_path, **filters)
+    cities = list(round_trip_costs.keys())
+    update_adjacency()
+
+
+def use_lazy_costs() -> None:
+    """
+    Replace the cost dictionaries by those of a LazyCostProvider, which starts from estimates
+    and fetches real prices on demand for the legs used by promising routes.
+    """
+    global one_way_costs, round_trip_costs, cities, cost_provider
+    # Imported here, since only lazy fetching requires the scraper's dependencies
+    from cost_provider import LazyCostProvider
+
+    cities = list(dict.fromkeys(origin_cities + destination_cities + mandatory_cities + optional_cities))
+    cost_provider = LazyCostProvider(cities)
+    one_way_costs = cost_provider.one_way_costs
+    round_trip_costs = cost_provider.round_trip_costs
+    update_adjacency()
+
+
+def update_adjacency() -> None:
+    """
+    Build the one-way successor lists and the available round-trip tickets from the current costs,
+    so that the operators only generate legs that can be flown.
+    """
+    global successors, available_round_trips
+    successors, available_round_trips = evaluator.build_adjacency(one_way_costs, round_trip_costs)
+
+
+def is_feasible_leg(departure: str, arrival: str) -> bool:
+    """
+    Check if a one-way flight from the departure to the arrival city exists.
+
+    Args:
+        departure (str): The departure city.
+        arrival (str): The arrival city.
 
     Returns:
-        List[str]: A valid route.
+        bool: True if the leg can be flown.
     """
-    route: List[str] = [start_city]
-    city_pool: List[str] = mandatory_cities * 2 + optional_cities * 2
-    random.shuffle(city_pool)
-    mandatory_remaining: List[str] = mandatory_cities.copy()
-    optional_picked: int = 0
+    return successors is None or arrival in successors.get(departure, ())
 
-    while True:
-        # Pick random starting
-        city = city_pool.pop()
-        route.append(city)
 
-        # Remove the city from mandatory cities
-        if city in mandatory_remaining:
-            mandatory_remaining.remove(city)
+def is_feasible(route: List[str]) -> bool:
+    """
+    Check if every leg of a route can be flown, one-way or covered by the out-and-back pattern of a round-trip ticket.
 
-        # If the city is in optiona cities
-        if city in optional_cities:
-            optional_picked += 1
+    Args:
+        route (List[str]): The route to check.
 
-        if not mandatory_remaining and optional_picked >= 1:
-            city_pool.append(start_city)
-            random.shuffle(city_pool)
+    Returns:
+        bool: True if the route can be flown.
+    """
+    return evaluator.is_feasible_route(route, successors, available_round_trips)
 
-        if city is start_city:
-            return route
+
+def random_insert_position(route: List[str], city: str) -> int:
+    """
+    Choose a random position (excluding start and end) to insert a city, preferring positions
+    where both new legs exist.
+
+    Args:
+        route (List[str]): The route.
+        city (str): The city to insert.
+
+    Returns:
+        int: The index to insert the city at.
+    """
+    positions = [i for i in range(1, len(route)) if is_feasible_leg(route[i - 1], city) and is_feasible_leg(city, route[i])]
+    if positions:
+        return random.choice(positions)
+    return random.randint(1, len(route) - 1)
+
+
+def generate_random_route() -> List[str]:
+    """
+    Generate a random valid route starting at an origin city and ending at a destination city.
+    Each mandatory and optional city appears twice in the pool.
+    Once all mandatory cities are picked at least once, and at least one optional city is picked,
+    a destination city is added to the pool. When the destination city is picked, the route ends.
+    Only legs that can be flown are picked, backtracking out of dead ends.
+
+    Returns:
+        List[str]: A valid route.
+
+    Raises:
+        ValueError: If no valid route can be flown.
+    """
+    return evaluator.generate_random_route(origin_cities, destination_cities, mandatory_cities, optional_cities,
+                                           successors, available_round_trips)
 
 
 def find_round_trip_options(route: List[str]) -> List[Tuple[str, str]]:
@@ -91,28 +206,7 @@ def find_round_trip_options(route: List[str]) -> List[Tuple[str, str]]:
     Returns:
         List[Tuple[str, str]]: A list of possible round-trip tickets as (departure, arrival).
     """
-    options: List[Tuple[str, str]] = []
-    route_length = len(route)
-    for i, departure_city in enumerate(route):
-        # Only consider valid departure cities for round-trip tickets
-        if departure_city not in round_trip_costs:
-            continue
-        # Find the next occurrence of the departure city
-        try:
-            next_index = route.index(departure_city, i + 1)
-        except ValueError:
-            continue  # No second occurrence found
-        # Ensure indices are within bounds
-        if i + 1 >= route_length or next_index - 1 < 0:
-            continue
-        arrival_city_first = route[i + 1]
-        arrival_city_second = route[next_index - 1]
-        # Check if the arrival cities are the same and valid
-        if arrival_city_first == arrival_city_second and arrival_city_first in round_trip_costs[departure_city]:
-            options.append((departure_city, arrival_city_first))
-    # Remove duplicates
-    options = list(set(options))
-    return options
+    return evaluator.find_round_trip_options(route, round_trip_costs)
 
 
 def calculate_cost(route: List[str]) -> Tuple[int, List[Tuple[str, str, str, int]]]:
@@ -125,39 +219,9 @@ def calculate_cost(route: List[str]) -> Tuple[int, List[Tuple[str, str, str, int
     Returns:
         Tuple[int, List[Tuple[str, str, str, int]]]: The total cost and flight details.
     """
-    total_cost = 0
-    flights = []
-
-    # Create list of legs in the route
-    legs = [(route[i], route[i + 1]) for i in range(len(route) - 1)]
-
-    # Initialize leg coverage
-    leg_covered = set()
-
-    # Find round-trip options using the updated method
-    round_trip_options = find_round_trip_options(route)
-
-    # For each identified round-trip option, cover the corresponding legs
-    for departure, arrival in round_trip_options:
-        leg1 = (departure, arrival)
-        leg2 = (arrival, departure)
-        # Purchase the round-trip ticket
-        total_cost += round_trip_costs[departure][arrival]
-        # Mark legs as covered
-        leg_covered.update([leg1, leg2])
-        # Add flights with zero cost for legs covered by round-trip ticket
-        flights.append((leg1[0], leg1[1], 'Round-trip leg (no additional cost)', 0))
-        flights.append((leg2[0], leg2[1], 'Round-trip leg (no additional cost)', 0))
-
-    # Cover remaining legs with one-way tickets
-    for leg in legs:
-        if leg not in leg_covered:
-            departure, arrival = leg
-            cost = one_way_costs[departure][arrival]
-            total_cost += cost
-            flights.append((departure, arrival, 'One-way flight', cost))
-
-    return total_cost, flights
+    global evaluation_count
+    evaluation_count += 1
+    return evaluator.calculate_cost(route, one_way_costs, round_trip_costs)
 
 
 
@@ -178,8 +242,12 @@ def crossover(parent1: List[str], parent2: List[str]) -> Tuple[List[str], List[s
     if min_length < 1:
         return parent1, parent2  # Can't perform crossover
 
-    # Choose a random split index
-    split_index = random.randint(1, min_length)  # Index between 1 and min_length
+    # Choose a random split index where both offspring are joined by existing legs
+    split_indices = [i for i in range(1, min_length + 1)
+                     if is_feasible_leg(parent1[i - 1], parent2[i]) and is_feasible_leg(parent2[i - 1], parent1[i])]
+    if not split_indices:
+        return parent1, parent2  # Can't perform crossover
+    split_index = random.choice(split_indices)
 
     # Create offspring
     offspring1 = parent1[:split_index] + parent2[split_index:]
@@ -189,13 +257,20 @@ def crossover(parent1: List[str], parent2: List[str]) -> Tuple[List[str], List[s
     offspring1 = repair_offspring(offspring1)
     offspring2 = repair_offspring(offspring2)
 
+    # Keep a parent if its offspring has legs that don't exist, e.g. half of a round-trip ticket
+    # whose out-and-back pattern was cut, or legs added by the repair
+    if not is_feasible(offspring1):
+        offspring1 = parent1
+    if not is_feasible(offspring2):
+        offspring2 = parent2
+
     return offspring1, offspring2
 
 def repair_offspring(offspring: List[str]) -> List[str]:
     """
     Repair an offspring to ensure it meets the constraints:
-    - Starts and ends with the starting city
-    - Each city (except the starting city) appears at most twice
+    - Starts with an origin city and ends with a destination city
+    - Each city (except the start and end) appears at most twice
     - All mandatory cities are included at least once
     - At least one optional city is included
 
@@ -205,27 +280,29 @@ def repair_offspring(offspring: List[str]) -> List[str]:
     Returns:
         List[str]: The repaired offspring route.
     """
-    # Ensure start and end city
-    if offspring[0] != start_city:
-        offspring.insert(0, start_city)
-    if offspring[-1] != start_city:
-        offspring.append(start_city)
+    # Ensure start and end city, preferring cities with a flight to or from the current route
+    if offspring[0] not in origin_cities:
+        origins = [city for city in origin_cities if is_feasible_leg(city, offspring[0])]
+        offspring.insert(0, random.choice(origins or origin_cities))
+    if offspring[-1] not in destination_cities:
+        destinations = [city for city in destination_cities if is_feasible_leg(offspring[-1], city)]
+        offspring.append(random.choice(destinations or destination_cities))
 
-    # Count city occurrences
-    city_counts = Counter(city for city in offspring if city != start_city)
+    # Count city occurrences (excluding start and end)
+    city_counts = Counter(offspring[1:-1])
 
     # Add missing mandatory cities
     for city in mandatory_cities:
         if city_counts.get(city, 0) == 0:
             # Insert at a random position (excluding start and end)
-            idx_to_insert = random.randint(1, len(offspring) - 1)
+            idx_to_insert = random_insert_position(offspring, city)
             offspring.insert(idx_to_insert, city)
 
     # Ensure at least one optional city is included
-    if not any(city in optional_cities for city in offspring):
+    if not any(city in optional_cities for city in offspring[1:-1]):
         # Insert a random optional city at a random position
         optional_city = random.choice(optional_cities)
-        idx_to_insert = random.randint(1, len(offspring) - 1)
+        idx_to_insert = random_insert_position(offspring, optional_city)
         offspring.insert(idx_to_insert, optional_city)
 
     # Ensure that each city appears at most twice
@@ -233,6 +310,9 @@ def repair_offspring(offspring: List[str]) -> List[str]:
         while count > 2:
             # Find indices of the city (excluding start and end)
             indices = [i for i, c in enumerate(offspring[1:-1], 1) if c == city]
+            # Prefer removals after which the neighbouring cities are connected
+            feasible_indices = [i for i in indices if is_feasible_leg(offspring[i - 1], offspring[i + 1])]
+            indices = feasible_indices or indices
             if indices:
                 idx_to_remove = random.choice(indices)
                 del offspring[idx_to_remove]
@@ -242,7 +322,7 @@ def repair_offspring(offspring: List[str]) -> List[str]:
 
     return offspring
 
-def mutate(route: List[str], min_optional_cities: int = 1) -> List[str]:
+def mutate(route: List[str], min_optional_cities: int = 1, mode: Optional[str] = None) -> List[str]:
     """
     Mutate a route by performing inversion mutation and adjusting optional cities.
 
@@ -252,34 +332,42 @@ def mutate(route: List[str], min_optional_cities: int = 1) -> List[str]:
     Args:
         route (List[str]): The route to mutate.
         min_optional_cities (int): The minimum number of optional cities that have to be visited in the solution.
+        mode (Optional[str]): 'remove' or 'add' to choose the adjustment of optional cities,
+            if None it is chosen randomly with a 0.75/0.25 split.
 
     Returns:
-        List[str]: The mutated route.
+        List[str]: The mutated route, or a copy of the route if the mutation broke the out-and-back pattern
+            of a round-trip ticket.
     """
+    original_route = route
     route = route.copy()
 
-    # Perform inversion mutation
+    # Perform inversion mutation, only on segments whose reversed legs exist
     indices = [i for i in range(1, len(route) - 1)]  # Exclude start and end indices
-    if len(indices) >= 2:
-        idx1, idx2 = sorted(random.sample(indices, 2))
+    segments = [(idx1, idx2) for idx1, idx2 in itertools.combinations(indices, 2)
+                if evaluator.is_feasible_route([route[idx1 - 1]] + route[idx1:idx2][::-1] + [route[idx2]], successors)]
+    if segments:
+        idx1, idx2 = random.choice(segments)
         route[idx1:idx2] = reversed(route[idx1:idx2])
 
     # Count occurrences of each city
-    city_counts = Counter(city for city in route if city != start_city)
+    city_counts = Counter(route[1:-1])
 
     # List of optional cities currently in the route
-    optional_cities_in_route = [city for city in route if city in optional_cities]
+    optional_cities_in_route = [city for city in route[1:-1] if city in optional_cities]
     num_optional_cities = len(optional_cities_in_route)
 
-    random_roll = random.random()
+    if mode is None:
+        mode = 'remove' if random.random() < 0.75 else 'add'
 
-    if random_roll < 0.75:
+    if mode == 'remove':
         # If more optional cities than required, randomly delete an optional city
         if num_optional_cities > min_optional_cities:
             # Choose a random optional city to remove
             city_to_remove = random.choice(optional_cities_in_route)
             # Remove one occurrence of the city (excluding start and end positions)
-            indices_to_remove = [i for i, city in enumerate(route) if city == city_to_remove and i != 0 and i != len(route) - 1]
+            indices_to_remove = [i for i, city in enumerate(route) if city == city_to_remove and i != 0 and i != len(route) - 1
+                                 and is_feasible_leg(route[i - 1], route[i + 1])]
             if indices_to_remove:
                 idx_to_remove = random.choice(indices_to_remove)
                 del route[idx_to_remove]
@@ -288,12 +376,43 @@ def mutate(route: List[str], min_optional_cities: int = 1) -> List[str]:
         # For optional cities that occur less than twice, randomly add one
         for city in optional_cities:
             if city_counts.get(city, 0) < 2:
-                # Insert at a random position (excluding start and end)
-                idx_to_insert = random.randint(1, len(route) - 1)
-                route.insert(idx_to_insert, city)
-                city_counts[city] += 1
+                # Insert at a random position (excluding start and end) where both new legs exist
+                positions = [i for i in range(1, len(route))
+                             if is_feasible_leg(route[i - 1], city) and is_feasible_leg(city, route[i])]
+                if positions:
+                    route.insert(random.choice(positions), city)
+                    city_counts[city] += 1
                 continue
 
+    if not is_feasible(route):
+        return original_route.copy()
+    return route
+
+
+def mutate_endpoints(route: List[str]) -> List[str]:
+    """
+    Mutate a route by replacing its start by another origin city, or its end by another destination city,
+    where the new leg exists.
+
+    Args:
+        route (List[str]): The route to mutate.
+
+    Returns:
+        List[str]: The mutated route, or a copy of the route if the mutation broke the out-and-back pattern
+            of a round-trip ticket.
+    """
+    original_route = route
+    route = route.copy()
+    if random.random() < 0.5:
+        origins = [city for city in origin_cities if city != route[0] and is_feasible_leg(city, route[1])]
+        if origins:
+            route[0] = random.choice(origins)
+    else:
+        destinations = [city for city in destination_cities if city != route[-1] and is_feasible_leg(route[-2], city)]
+        if destinations:
+            route[-1] = random.choice(destinations)
+    if not is_feasible(route):
+        return original_route.copy()
     return route
 
 
@@ -309,9 +428,22 @@ def tournament_selection(population: List[List[str]], fitnesses: List[int], k: i
     Returns:
         List[str]: The selected individual.
     """
-    selected_indices = random.sample(range(len(population)), k)
-    best_idx = min(selected_indices, key=lambda idx: fitnesses[idx])
-    return population[best_idx]
+    return population[tournament_selection_index(fitnesses, k)]
+
+
+def tournament_selection_index(fitnesses: List[int], k: int) -> int:
+    """
+    Select the index of an individual using tournament selection.
+
+    Args:
+        fitnesses (List[int]): The fitness scores of the population.
+        k (int): The tournament size.
+
+    Returns:
+        int: The index of the selected individual.
+    """
+    selected_indices = random.sample(range(len(fitnesses)), k)
+    return min(selected_indices, key=lambda idx: fitnesses[idx])
 
 def local_search(route: List[str]) -> List[str]:
     """
@@ -331,6 +463,8 @@ def local_search(route: List[str]) -> List[str]:
         new_route = route.copy()
         # Swap cities at positions i and i+1
         new_route[i], new_route[i + 1] = new_route[i + 1], new_route[i]
+        if not is_feasible(new_route):
+            continue  # Don't spend an evaluation on legs that don't exist
         new_cost, _ = calculate_cost(new_route)
         if new_cost < best_cost:
             best_route = new_route
@@ -339,60 +473,443 @@ def local_search(route: List[str]) -> List[str]:
     return best_route
 
 
-def run_genetic_algorithm():
+def update_best(route: List[str], cost: int) -> None:
     """
-    Run the genetic algorithm with the specified parameters.
+    Update the global best route if the given route is cheaper.
+
+    Args:
+        route (List[str]): The evaluated route.
+        cost (int): The cost of the route.
     """
     global best_cost, best_route, best_flights
+    if cost < best_cost:
+        best_cost = cost
+        best_route = route.copy()
+        _, best_flights = calculate_cost(best_route)
+
+
+def evaluate_population(population: List[List[str]]) -> List[int]:
+    """
+    Calculate the fitness of every route in the population and track the best route.
+
+    Args:
+        population (List[List[str]]): The population to evaluate.
+
+    Returns:
+        List[int]: The fitness scores of the population.
+    """
+    fitnesses: List[int] = []
+    for route in population:
+        cost, _ = calculate_cost(route)
+        fitnesses.append(cost)
+        update_best(route, cost)
+    return fitnesses
+
 
+def select_best_routes(population: List[List[str]], fitnesses: List[int], k: int) -> List[List[str]]:
+    """
+    Select the k cheapest distinct routes from the population.
+
+    Args:
+        population (List[List[str]]): The population.
+        fitnesses (List[int]): The fitness scores of the population.
+        k (int): The number of routes to select.
+
+    Returns:
+        List[List[str]]: The selected routes, cheapest first.
+    """
+    best_routes: List[List[str]] = []
+    for idx in sorted(range(len(population)), key=lambda i: fitnesses[i]):
+        if population[idx] not in best_routes:
+            best_routes.append(population[idx])
+        if len(best_routes) == k:
+            break
+    return best_routes
+
+
+def save_population_state(population: List[List[str]], fitnesses: List[int]) -> None:
+    """
+    Save the final population, its fitnesses, the best routes and the prices they were scored with,
+    so that a later run can warm start from them.
+
+    Args:
+        population (List[List[str]]): The final population.
+        fitnesses (List[int]): The fitness scores of the final population.
+    """
+    best_routes = select_best_routes(population, fitnesses, best_routes_count)
+    if best_route is not None and best_route not in best_routes:
+        best_routes.insert(0, best_route)
+    state = {
+        'population': population,
+        'fitnesses': fitnesses,
+        'best_routes': best_routes,
+        'one_way_costs': one_way_costs,
+        'round_trip_costs': round_trip_costs,
+    }
+    with open(state_file_path, 'w') as f:
+        json.dump(state, f)
+
+
+def route_legs(route: List[str]) -> Set[Tuple[str, str, str]]:
+    """
+    Find the one-way legs and round-trip tickets whose prices determine the cost of a route.
+    Keys are ('one_way', departure, arrival) or ('round_trip', departure, arrival).
+
+    Args:
+        route (List[str]): The route to analyze.
+
+    Returns:
+        Set[Tuple[str, str, str]]: The legs and tickets used by the route.
+    """
+    legs = {('one_way', route[i], route[i + 1]) for i in range(len(route) - 1)}
+    # Include round-trip tickets that can't be bought, since their price may change
+    legs.update(('round_trip', departure, arrival)
+                for departure, arrival in evaluator.find_round_trip_options(route, round_trip_costs, available_only=False))
+    return legs
+
+
+def build_leg_index(population: List[List[str]]) -> Dict[Tuple[str, str, str], Set[int]]:
+    """
+    Build an index from every one-way leg and round-trip ticket to the routes that use it.
+
+    Args:
+        population (List[List[str]]): The routes to index.
+
+    Returns:
+        Dict[Tuple[str, str, str], Set[int]]: The indices of the routes using each leg or ticket.
+    """
+    leg_index: Dict[Tuple[str, str, str], Set[int]] = defaultdict(set)
+    for idx, route in enumerate(population):
+        for leg in route_legs(route):
+            leg_index[leg].add(idx)
+    return leg_index
+
+
+def find_changed_legs(previous_one_way_costs: Dict[str, Dict[str, int]],
+                      previous_round_trip_costs: Dict[str, Dict[str, int]]) -> Optional[Set[Tuple[str, str, str]]]:
+    """
+    Compare the previous prices with the currently loaded prices.
+
+    Args:
+        previous_one_way_costs (Dict[str, Dict[str, int]]): The one-way prices of the previous run.
+        previous_round_trip_costs (Dict[str, Dict[str, int]]): The round-trip prices of the previous run.
+
+    Returns:
+        Optional[Set[Tuple[str, str, str]]]: The changed legs and tickets, keyed like build_leg_index.
+            None if routes were added or removed, since then every route has to be re-scored.
+    """
+    changed_legs: Set[Tuple[str, str, str]] = set()
+    for kind, previous, current in (('one_way', previous_one_way_costs, one_way_costs),
+                                    ('round_trip', previous_round_trip_costs, round_trip_costs)):
+        for origin in set(previous) | set(current):
+            previous_destinations = previous.get(origin, {})
+            current_destinations = current.get(origin, {})
+            if set(previous_destinations) != set(current_destinations):
+                return None
+            for destination, price in current_destinations.items():
+                if previous_destinations[destination] != price:
+                    changed_legs.add((kind, origin, destination))
+    return changed_legs
+
+
+def rescore_routes(routes: List[List[str]], fitnesses: List[int],
+                   changed_legs: Optional[Set[Tuple[str, str, str]]]) -> Tuple[List[int], int]:
+    """
+    Re-score only the routes that use a changed leg or round-trip ticket.
+
+    Args:
+        routes (List[List[str]]): The routes to re-score.
+        fitnesses (List[int]): The fitness scores under the previous prices.
+        changed_legs (Optional[Set[Tuple[str, str, str]]]): The changed legs, or None to re-score everything.
+
+    Returns:
+        Tuple[List[int], int]: The updated fitness scores and the number of re-scored routes.
+    """
+    fitnesses = fitnesses.copy()
+    if changed_legs is None:
+        affected = set(range(len(routes)))
+    else:
+        leg_index = build_leg_index(routes)
+        affected = set()
+        for leg in changed_legs:
+            affected |= leg_index.get(leg, set())
+
+    for idx in affected:
+        fitnesses[idx], _ = calculate_cost(routes[idx])
+    return fitnesses, len(affected)
+
+
+def fetch_promising_prices(population: List[List[str]], fitnesses: List[int]) -> Tuple[List[int], int]:
+    """
+    Fetch the unknown prices used by the most promising routes and re-score the routes that use them.
+
+    Args:
+        population (List[List[str]]): The current population.
+        fitnesses (List[int]): The fitness scores of the population.
+
+    Returns:
+        Tuple[List[int], int]: The updated fitness scores and the number of fetched prices.
+    """
+    global best_cost
+    promising_routes = select_best_routes(population, fitnesses, lazy_fetch_count)
+    if best_route is not None:
+        promising_routes.append(best_route)
+    fetched_legs = cost_provider.fetch(set().union(*(route_legs(route) for route in promising_routes)))
+    if not fetched_legs:
+        return fitnesses, 0
+
+    update_adjacency()
+    fitnesses, _ = rescore_routes(population, fitnesses, fetched_legs)
+
+    # The best cost may have been based on estimates, so find the best route again
+    previous_best_route = best_route
+    best_cost = float('inf')
+    if previous_best_route is not None:
+        update_best(previous_best_route, calculate_cost(previous_best_route)[0])
+    for route, cost in zip(population, fitnesses):
+        update_best(route, cost)
+    return fitnesses, len(fetched_legs)
+
+
+def save_checkpoint(population: List[List[str]], fitnesses: List[int], generation: int, num_generations: int,
+                    operator_selection: AdaptiveOperatorSelection) -> None:
+    """
+    Save the state of a run to the checkpoint file, so that it can be resumed after it was killed.
+    The file is written to a temporary file first and then renamed, so a checkpoint is never half written.
+
+    Args:
+        population (List[List[str]]): The current population.
+        fitnesses (List[int]): The fitness scores of the population.
+        generation (int): The number of evolved generations.
+        num_generations (int): The total number of generations of the run.
+        operator_selection (AdaptiveOperatorSelection): The operator selection with its statistics.
+    """
+    state = {
+        'population': population,
+        'fitnesses': fitnesses,
+        'generation': generation,
+        'num_generations': num_generations,
+        'best_cost': best_cost,
+        'best_route': best_route,
+        'best_flights': best_flights,
+        'operator_selection': operator_selection,
+        'random_state': random.getstate(),
+    }
+    checkpoint_folder = os.path.dirname(checkpoint_file_path) or '.'
+    with tempfile.NamedTemporaryFile('wb', dir=checkpoint_folder, delete=False) as f:
+        with gzip.GzipFile(fileobj=f, mode='wb') as gzip_file:
+            pickle.dump(state, gzip_file, protocol=pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(f.name, checkpoint_file_path)
+
+
+def resume_genetic_algorithm():
+    """
+    Resume a run from the last checkpoint. The population, fitnesses, best route, operator selection and
+    random state are restored, so the run continues exactly as it would have without interruption,
+    as long as the operator probabilities are not adapted to measured CPU time. The checkpoint stores whether
+    the run credits the operators deterministically (deterministic_operators), and the resumed run keeps doing so.
+    """
+    global best_cost, best_route, best_flights
+    with gzip.open(checkpoint_file_path, 'rb') as f:
+        state = pickle.load(f)
+
+    best_cost = state['best_cost']
+    best_route = state['best_route']
+    best_flights = state['best_flights']
+    random.setstate(state['random_state'])
+    print(f"Resuming from generation {state['generation']} of {state['num_generations']}")
+
+    run_genetic_algorithm(state['population'], state['fitnesses'], state['num_generations'],
+                          start_generation=state['generation'], operator_selection=state['operator_selection'])
+
+
+def warm_start_genetic_algorithm():
+    """
+    Re-optimize after a price refresh, starting from the final population of the previous run.
+    Only the routes using changed legs are re-scored, the best routes of the previous run are
+    re-injected in place of the worst individuals, and the population evolves for a short budget.
+    """
+    with open(state_file_path, 'r') as f:
+        state = json.load(f)
+
+    changed_legs = find_changed_legs(state['one_way_costs'], state['round_trip_costs'])
+    population: List[List[str]] = state['population']
+    fitnesses, rescored = rescore_routes(population, state['fitnesses'], changed_legs)
+    best_routes: List[List[str]] = state['best_routes']
+    best_fitnesses = [calculate_cost(route)[0] for route in best_routes]
+
+    if changed_legs is None:
+        print("Routes were added or removed, re-scored the full population")
+    else:
+        print(f"{len(changed_legs)} changed prices, re-scored {rescored} of {len(population)} routes")
+
+    # Replace the worst individuals by the best routes of the previous run
+    worst_indices = sorted(range(len(population)), key=lambda i: fitnesses[i], reverse=True)
+    for idx, route, cost in zip(worst_indices, best_routes, best_fitnesses):
+        if route not in population:
+            population[idx] = route
+            fitnesses[idx] = cost
+
+    for route, cost in zip(population, fitnesses):
+        update_best(route, cost)
+
+    run_genetic_algorithm(population, fitnesses, warm_start_generations)
+
+
+def apply_operator(operator_selection: AdaptiveOperatorSelection, name: str,
+                   operator: Callable[[List[str]], List[str]], route: List[str], cost: int) -> Tuple[List[str], int]:
+    """
+    Apply an operator if the operator selection decides so, and credit it with the improvement it achieved
+    and the route evaluations it took, including the evaluation of its result.
+
+    Args:
+        operator_selection (AdaptiveOperatorSelection): The operator selection.
+        name (str): The name of the operator.
+        operator (Callable[[List[str]], List[str]]): The operator.
+        route (List[str]): The route to apply the operator to.
+        cost (int): The cost of the route.
+
+    Returns:
+        Tuple[List[str], int]: The resulting route and its cost.
+    """
+    if not operator_selection.apply(name):
+        return route, cost
+    start_time = time.process_time()
+    start_evaluations = evaluation_count
+    new_route = operator(route)
+    new_cost, _ = calculate_cost(new_route)
+    operator_selection.record(name, cost - new_cost, evaluation_count - start_evaluations,
+                              time.process_time() - start_time)
+    return new_route, new_cost
+
+
+def run_genetic_algorithm(population: Optional[List[List[str]]] = None,
+                          fitnesses: Optional[List[int]] = None,
+                          num_generations: int = generations,
+                          should_stop: Optional[Callable[[], bool]] = None,
+                          verbose: bool = True,
+                          start_generation: int = 0,
+                          operator_selection: Optional[AdaptiveOperatorSelection] = None):
+    """
+    Run the genetic algorithm with the specified parameters.
+
+    Args:
+        population (Optional[List[List[str]]]): The initial population, random routes if None.
+        fitnesses (Optional[List[int]]): The fitness scores of the initial population, calculated if None.
+        num_generations (int): The number of generations to evolve.
+        should_stop (Optional[Callable[[], bool]]): Checked before every generation, the run stops when it returns True.
+        verbose (bool): Whether to print the progress and results, write checkpoints and save the final population.
+        start_generation (int): The number of generations that were already evolved, when resuming.
+        operator_selection (Optional[AdaptiveOperatorSelection]): The operator selection to continue with, when resuming.
+    """
     # Initialize population
-    population: List[List[str]] = []
-    for _ in range(population_size):
-        route = generate_random_route()
-        population.append(route)
+    if population is None:
+        population = []
+        for _ in range(population_size):
+            route = generate_random_route()
+            population.append(route)
+    if fitnesses is None:
+        fitnesses = evaluate_population(population)
+        if cost_provider is not None:
+            fitnesses, _ = fetch_promising_prices(population, fitnesses)
+
+    if operator_selection is None:
+        operator_selection = AdaptiveOperatorSelection(operator_probabilities, adapt=adaptive_operators,
+                                                       deterministic=deterministic_operators)
+    last_checkpoint_time = time.time()
 
     # Evolutionary loop
-    for generation in range(generations):
-        fitnesses: List[int] = []
-        for route in population:
-            cost, _ = calculate_cost(route)
-            fitnesses.append(cost)
-            if cost < best_cost:
-                best_cost = cost
-                best_route = route.copy()
-                _, best_flights = calculate_cost(best_route)
-
+    for generation in range(start_generation, num_generations):
+        if should_stop is not None and should_stop():
+            break
         # Print best cost and route of the current generation
-        print(f"Generation {generation+1}: Best Cost = €{best_cost}, Route = {' -> '.join(best_route)}")
+        if verbose:
+            print(f"Generation {generation+1}: Best Cost = €{best_cost}, Route = {' -> '.join(best_route)}")
 
         new_population: List[List[str]] = []
+        new_fitnesses: List[int] = []
         # Elitism: Preserve the best individuals
-        elites = [population[idx] for idx in sorted(range(len(fitnesses)), key=lambda i: fitnesses[i])[:elitism_count]]
-        new_population.extend(elites)
+        for idx in sorted(range(len(fitnesses)), key=lambda i: fitnesses[i])[:elitism_count]:
+            new_population.append(population[idx])
+            new_fitnesses.append(fitnesses[idx])
 
         while len(new_population) < population_size:
             # Selection
-            parent1 = tournament_selection(population, fitnesses, tournament_size)
-            parent2 = tournament_selection(population, fitnesses, tournament_size)
+            parent1_idx = tournament_selection_index(fitnesses, tournament_size)
+            parent2_idx = tournament_selection_index(fitnesses, tournament_size)
+            parent1, parent2 = population[parent1_idx], population[parent2_idx]
 
             # Crossover
-            offspring1, offspring2 = crossover(parent1, parent2)
-
-            # Mutation
-            if random.random() < mutation_rate:
-                offspring1 = mutate(offspring1)
-            if random.random() < mutation_rate:
-                offspring2 = mutate(offspring2)
-
-            # Local search
-            offspring1 = local_search(offspring1)
-            new_population.append(offspring1)
-
-            if len(new_population) < population_size:
-                offspring2 = local_search(offspring2)
-                new_population.append(offspring2)
-
+            offspring = [(parent1, fitnesses[parent1_idx]), (parent2, fitnesses[parent2_idx])]
+            if operator_selection.apply('crossover'):
+                start_time = time.process_time()
+                start_evaluations = evaluation_count
+                offspring1, offspring2 = crossover(parent1, parent2)
+                offspring = [(offspring1, calculate_cost(offspring1)[0]), (offspring2, calculate_cost(offspring2)[0])]
+                parent_cost = min(fitnesses[parent1_idx], fitnesses[parent2_idx])
+                operator_selection.record('crossover', sum(max(parent_cost - cost, 0) for _, cost in offspring),
+                                          evaluation_count - start_evaluations, time.process_time() - start_time)
+
+            for route, cost in offspring:
+                if len(new_population) >= population_size:
+                    break
+
+                # Mutation
+                route, cost = apply_operator(operator_selection, 'mutate_remove', lambda r: mutate(r, mode='remove'), route, cost)
+                route, cost = apply_operator(operator_selection, 'mutate_add', lambda r: mutate(r, mode='add'), route, cost)
+                if len(origin_cities) > 1 or len(destination_cities) > 1:
+                    route, cost = apply_operator(operator_selection, 'mutate_endpoints', mutate_endpoints, route, cost)
+
+                # Local search
+                route, cost = apply_operator(operator_selection, 'local_search', local_search, route, cost)
+
+                new_population.append(route)
+                new_fitnesses.append(cost)
+                update_best(route, cost)
+
+        operator_selection.update()
         population = new_population
+        fitnesses = new_fitnesses
+        if cost_provider is not None:
+            fitnesses, _ = fetch_promising_prices(population, fitnesses)
+
+        # Checkpoint every N generations or T seconds
+        if verbose and ((generation + 1) % checkpoint_every_generations == 0
+                        or time.time() - last_checkpoint_time >= checkpoint_every_seconds):
+            save_checkpoint(population, fitnesses, generation + 1, num_generations, operator_selection)
+            last_checkpoint_time = time.time()
+
+    # Make sure the best routes are scored with real prices only
+    if cost_provider is not None:
+        fetched_count = 1
+        while fetched_count:
+            fitnesses, fetched_count = fetch_promising_prices(population, fitnesses)
+        if verbose:
+            print(f"\nFetched {cost_provider.fetched_fraction():.0%} of all prices")
+
+    if not verbose:
+        return
+
+    if cost_provider is not None:
+        # The legs and tickets the cost of the best route is made of, see calculate_cost
+        round_trips = find_round_trip_options(best_route)
+        covered_legs = {leg for departure, arrival in round_trips for leg in ((departure, arrival), (arrival, departure))}
+        used_legs = {('round_trip', departure, arrival) for departure, arrival in round_trips}
+        used_legs.update(('one_way', best_route[i], best_route[i + 1]) for i in range(len(best_route) - 1)
+                         if (best_route[i], best_route[i + 1]) not in covered_legs)
+        unpriced_legs = sorted(leg for leg in used_legs if not cost_provider.has_price(*leg))
+        if unpriced_legs:
+            raise SystemExit("No prices could be fetched for " +
+                             ', '.join(f"{kind.replace('_', '-')} {departure}-{arrival}"
+                                       for kind, departure, arrival in unpriced_legs)
+                             + f", so the best route found ({' -> '.join(best_route)}) has no known cost")
+
+    operator_selection.print_report()
+
+    # Save the final population for warm starts
+    save_population_state(population, fitnesses)
 
     # Output the best route and cost
     print("\nOptimal Route:", ' -> '.join(best_route))
@@ -403,7 +920,50 @@ def run_genetic_algorithm():
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find the cheapest route with a memetic algorithm.")
+    parser.add_argument('--warm-start', action='store_true',
+                        help="Re-optimize from the final population of the previous run after a price refresh.")
+    parser.add_argument('--resume', action='store_true',
+                        help="Resume a killed run from its last checkpoint in the data folder.")
+    parser.add_argument('--deterministic', action='store_true',
+                        help="Adapt the operators to their improvement per route evaluation instead of per CPU second, "
+                             "so that a resumed run continues exactly as the uninterrupted run would have.")
+    parser.add_argument('--lazy', action='store_true',
+                        help="Fetch prices on demand for promising routes instead of loading them from the data folder.")
+    parser.add_argument('--database', metavar='PATH',
+                        help="Build the costs from the flight store written by the scraper, e.g. data/flights.db.")
+    parser.add_argument('--max-layovers', type=int, default=1,
+                        help="Maximum number of layovers when building costs from the flight store.")
+    parser.add_argument('--max-duration', type=float, default=20,
+                        help="Total travel duration must be shorter than this many hours.")
+    parser.add_argument('--earliest-departure', type=float, default=7,
+                        help="Earliest local departure time in hours after midnight.")
+    parser.add_argument('--departure-date', help="Only use flights departing on this date (YYYY-MM-DD).")
+    parser.add_argument('--return-date', help="Only use round-trip tickets returning on this date (YYYY-MM-DD).")
+    parser.add_argument('--origins', nargs='+', default=origin_cities, help="The cities where the trip can start.")
+    parser.add_argument('--destinations', nargs='+',
+                        help="The cities where the trip can end, the origins if not given.")
+    args = parser.parse_args()
+
+    origin_cities = args.origins
+    destination_cities = args.destinations or args.origins
+    deterministic_operators = args.deterministic
     best_cost = float('inf')
     best_route = None
     best_flights = None
-    run_genetic_algorithm()
\ No newline at end of file
+    if args.lazy:
+        use_lazy_costs()
+    elif args.database:
+        load_costs_from_store(args.database, departure_date=args.departure_date,
+                              return_date=args.return_date, max_layovers=args.max_layovers,
+                              max_duration_minutes=int(args.max_duration * 60),
+                              earliest_departure_minutes=int(args.earliest_departure * 60))
+    else:
+        load_costs()
+
+    if args.resume:
+        resume_genetic_algorithm()
+    elif args.warm_start:
+        warm_start_genetic_algorithm()
+    else:
+        run_genetic_algorithm()
@@ -0,0 +1,125 @@
+from typing import Dict
+import random
+
+
+class AdaptiveOperatorSelection:
+    """
+    Multi-armed bandit that adapts the application probability of each operator in the memetic loop.
+
+    Each operator is credited with the cost reduction it achieved per second of CPU time, including the
+    evaluation of its result. Since measured time differs between runs, a run resumed from a checkpoint then
+    adapts differently from the uninterrupted run. With deterministic credit, operators are credited per route
+    evaluation instead, so that resumed runs adapt identically, at the cost of ignoring the work besides the
+    evaluations. After every generation the credit of that generation is folded into an
+    exponential moving average, and the probabilities pursue targets proportional to the averaged credit:
+    the best operator moves towards max_probability, operators that stopped paying off towards min_probability.
+
+    Args:
+        initial_probabilities (Dict[str, float]): The starting application probability per operator.
+        min_probability (float): The lowest probability, so that every operator keeps being explored.
+        max_probability (float): The highest probability.
+        learning_rate (float): How fast the probabilities move towards their targets.
+        decay (float): The weight of earlier generations in the averaged credit.
+        adapt (bool): Whether to adapt the probabilities, or only record the statistics.
+        deterministic (bool): Whether to credit the operators per route evaluation instead of per CPU second.
+    """
+
+    def __init__(self, initial_probabilities: Dict[str, float], min_probability: float = 0.1,
+                 max_probability: float = 1.0, learning_rate: float = 0.3, decay: float = 0.8, adapt: bool = True,
+                 deterministic: bool = False):
+        self.probabilities = dict(initial_probabilities)
+        self.min_probability = min_probability
+        self.max_probability = max_probability
+        self.learning_rate = learning_rate
+        self.decay = decay
+        self.adapt = adapt
+        self.deterministic = deterministic
+
+        self.credit: Dict[str, float] = {name: 0.0 for name in initial_probabilities}
+        self.statistics: Dict[str, Dict[str, float]] = {
+            name: {'applications': 0, 'improvements': 0, 'gain': 0.0, 'evaluations': 0, 'cpu_time': 0.0}
+            for name in initial_probabilities
+        }
+        self.generation_statistics: Dict[str, Dict[str, float]] = {
+            name: {'gain': 0.0, 'evaluations': 0, 'cpu_time': 0.0} for name in initial_probabilities
+        }
+
+    def apply(self, name: str) -> bool:
+        """
+        Decide whether to apply an operator.
+
+        Args:
+            name (str): The operator.
+
+        Returns:
+            bool: True if the operator should be applied.
+        """
+        return random.random() < self.probabilities[name]
+
+    def record(self, name: str, gain: float, evaluations: int, cpu_time: float) -> None:
+        """
+        Record the result of applying an operator.
+
+        Args:
+            name (str): The operator.
+            gain (float): The cost reduction achieved, negative if the result got worse.
+            evaluations (int): The number of routes evaluated.
+            cpu_time (float): The CPU time spent, in seconds.
+        """
+        gain = max(gain, 0.0)
+        statistics = self.statistics[name]
+        statistics['applications'] += 1
+        statistics['improvements'] += gain > 0
+        statistics['gain'] += gain
+        statistics['evaluations'] += evaluations
+        statistics['cpu_time'] += cpu_time
+        self.generation_statistics[name]['gain'] += gain
+        self.generation_statistics[name]['evaluations'] += evaluations
+        self.generation_statistics[name]['cpu_time'] += cpu_time
+
+    def update(self) -> None:
+        """
+        Fold the credit of the past generation into the average and adapt the probabilities.
+        """
+        for name, statistics in self.generation_statistics.items():
+            effort = statistics['evaluations'] if self.deterministic else statistics['cpu_time']
+            if effort > 0:
+                rate = statistics['gain'] / effort
+                self.credit[name] = self.decay * self.credit[name] + (1 - self.decay) * rate
+            statistics['gain'] = 0.0
+            statistics['evaluations'] = 0
+            statistics['cpu_time'] = 0.0
+
+        best_credit = max(self.credit.values())
+        if not self.adapt or best_credit <= 0:
+            return
+        for name, probability in self.probabilities.items():
+            target = self.min_probability + (self.max_probability - self.min_probability) * self.credit[name] / best_credit
+            self.probabilities[name] = probability + self.learning_rate * (target - probability)
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        """
+        Report the statistics of every operator.
+
+        Returns:
+            Dict[str, Dict[str, float]]: Per operator the applications, improvements, total gain, evaluations,
+                CPU time, gain per evaluation, gain per CPU second and current probability.
+        """
+        report = {}
+        for name, statistics in self.statistics.items():
+            report[name] = dict(statistics)
+            report[name]['gain_per_evaluation'] = statistics['gain'] / statistics['evaluations'] if statistics['evaluations'] else 0.0
+            report[name]['gain_per_second'] = statistics['gain'] / statistics['cpu_time'] if statistics['cpu_time'] else 0.0
+            report[name]['probability'] = self.probabilities[name]
+        return report
+
+    def print_report(self) -> None:
+        """
+        Print the statistics of every operator.
+        """
+        print("\nOperator Statistics:")
+        for name, statistics in self.report().items():
+            print(f"  {name}: applied {statistics['applications']}x, improved {statistics['improvements']}x, "
+                  f"gain €{statistics['gain']:.0f} in {statistics['evaluations']:.0f} evaluations "
+                  f"(€{statistics['gain_per_evaluation']:.1f}/evaluation) and {statistics['cpu_time']:.2f}s CPU "
+                  f"(€{statistics['gain_per_second']:.0f}/s), probability {statistics['probability']:.2f}")
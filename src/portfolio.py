@@ -0,0 +1,128 @@
+from collections import Counter
+from typing import List, Optional
+import argparse
+import multiprocessing
+import queue
+import random
+import time
+
+from engines import ENGINES, SharedIncumbent
+from evaluator import RouteEvaluator
+
+poll_interval: float = 1.0  # Seconds between checks whether an engine process died without a result
+
+
+def run_engine(name: str, evaluator: RouteEvaluator, time_limit: float, incumbent: SharedIncumbent,
+               results: multiprocessing.Queue, seed: Optional[int]) -> None:
+    """
+    Run a single engine of the portfolio and put its result on the results queue.
+    If the engine raises an exception, a result without route is put with the error instead.
+
+    Args:
+        name (str): The name of the engine.
+        evaluator (RouteEvaluator): The shared evaluator.
+        time_limit (float): The wall-clock time limit in seconds.
+        incumbent (SharedIncumbent): The incumbent shared with the other engines.
+        results (multiprocessing.Queue): The queue receiving the result.
+        seed (Optional[int]): The random seed, None to seed from the operating system.
+    """
+    # Reseed, since forked processes inherit the random state of the parent
+    random.seed(seed)
+    start_time = time.time()
+    try:
+        route, cost = ENGINES[name](evaluator, time_limit=time_limit, incumbent=incumbent).run()
+    except Exception as e:
+        results.put({'engine': name, 'route': None, 'cost': float('inf'), 'time': time.time() - start_time,
+                     'error': repr(e)})
+        raise
+    results.put({'engine': name, 'route': route, 'cost': cost, 'time': time.time() - start_time})
+
+
+def run_portfolio(evaluator: RouteEvaluator, engine_names: List[str], time_limit: float,
+                  target_cost: Optional[float] = None, seed: Optional[int] = None) -> List[dict]:
+    """
+    Race several engines in parallel processes on the same instance. The engines share the incumbent
+    best cost, and all of them stop as soon as one reaches the target cost. An engine that fails or whose process dies gets a result with an error.
+
+    Args:
+        evaluator (RouteEvaluator): The shared evaluator.
+        engine_names (List[str]): The names of the engines to race, see engines.ENGINES.
+        time_limit (float): The wall-clock time limit in seconds.
+        target_cost (Optional[float]): The cost at which all engines stop, None to race until the time limit.
+        seed (Optional[int]): The base random seed, each engine adds its position in the portfolio.
+
+    Returns:
+        List[dict]: The result of each engine with its best route, cost and run time, cheapest first.
+            Failed engines have no route, an infinite cost and an error.
+    """
+    incumbent = SharedIncumbent(target_cost)
+    results: multiprocessing.Queue = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=run_engine, args=(name, evaluator, time_limit, incumbent, results,
+                                                         None if seed is None else seed + i))
+        for i, name in enumerate(engine_names)
+    ]
+    for process in processes:
+        process.start()
+
+    # Collect the results before joining, so that no process blocks on a full queue
+    engine_results: List[dict] = []
+    while len(engine_results) < len(processes):
+        try:
+            engine_results.append(results.get(timeout=poll_interval))
+        except queue.Empty:
+            if all(process.exitcode is not None for process in processes):
+                # Every process exited, take the results that arrived since the timeout
+                while len(engine_results) < len(processes):
+                    try:
+                        engine_results.append(results.get_nowait())
+                    except queue.Empty:
+                        break
+                break
+    for process in processes:
+        process.join()
+
+    # Engines whose process died without putting a result, attributed to failed processes first
+    missing_engines = Counter(engine_names) - Counter(result['engine'] for result in engine_results)
+    for process, name in sorted(zip(processes, engine_names), key=lambda pair: pair[0].exitcode == 0):
+        if missing_engines[name]:
+            missing_engines[name] -= 1
+            engine_results.append({'engine': name, 'route': None, 'cost': float('inf'), 'time': time_limit,
+                                   'error': f"Process exited with code {process.exitcode} without a result"})
+
+    return sorted(engine_results, key=lambda result: result['cost'])
+
+
+if __name__ == "__main__":
+    import memetic_algorithm
+
+    parser = argparse.ArgumentParser(description="Race several search engines on the same instance.")
+    parser.add_argument('--engines', nargs='+', choices=list(ENGINES), default=list(ENGINES),
+                        help="The engines to race.")
+    parser.add_argument('--time-limit', type=float, default=60, help="The wall-clock time limit in seconds.")
+    parser.add_argument('--target', type=float, help="Stop all engines once one finds a route this cheap.")
+    parser.add_argument('--seed', type=int, help="The base random seed.")
+    args = parser.parse_args()
+
+    memetic_algorithm.load_costs()
+    route_evaluator = RouteEvaluator(memetic_algorithm.one_way_costs, memetic_algorithm.round_trip_costs,
+                                     memetic_algorithm.origin_cities, memetic_algorithm.destination_cities,
+                                     memetic_algorithm.mandatory_cities, memetic_algorithm.optional_cities)
+
+    portfolio_results = run_portfolio(route_evaluator, args.engines, args.time_limit, args.target, args.seed)
+
+    print("\nEngine Results:")
+    for result in portfolio_results:
+        if 'error' in result:
+            print(f"  {result['engine']}: failed with {result['error']}")
+        else:
+            print(f"  {result['engine']}: €{result['cost']} in {result['time']:.1f}s")
+
+    best_result = portfolio_results[0]
+    if best_result['route'] is None:
+        raise SystemExit("All engines failed")
+    print(f"\nOptimal Route ({best_result['engine']}):", ' -> '.join(best_result['route']))
+    print(f"Total Cost: €{best_result['cost']}")
+    print("Flight Details:")
+    for flight in route_evaluator.flights(best_result['route']):
+        print(f"  {flight[0]} to {flight[1]} via {flight[2]}: €{flight[3]}")
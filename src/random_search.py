@@ -1,5 +1,8 @@
 import random
 import itertools
+import argparse
+import multiprocessing
+from typing import Callable, Iterator, List, Tuple
 
 # Define the cities
 cities = ['AMS', 'BLR', 'HKT', 'BKK', 'KL']
@@ -35,6 +38,12 @@ optional_cities = ['BKK', 'KL']
 # Number of iterations for the random search
 iterations = 100000
 
+# Exhaustive search parameters
+start_city = 'AMS'
+max_intermediate_cities = 10  # Same limit on the route length as the random search
+chunk_depth = 2  # Number of leading cities that define a chunk of the enumeration
+shared_incumbent = None  # Best cost shared by the worker processes of a parallel exhaustive search
+
 # Initialize the best cost and route
 best_cost = float('inf')
 best_route = None
@@ -157,19 +166,230 @@ def calculate_cost(route):
                 best_flights = flights.copy()
     return min_total_cost, best_flights
 
-for _ in range(iterations):
-    route = generate_random_route()
-    if not is_valid_route(route):
-        continue
-    total_cost, flights = calculate_cost(route)
-    if total_cost < best_cost:
-        best_cost = total_cost
-        best_route = route.copy()
-        best_flights = flights.copy()
-
-# Output the best route and cost
-print("Optimal Route:", ' -> '.join(best_route))
-print(f"Total Cost: € {best_cost}")
-print("Flight Details:")
-for flight in best_flights:
-    print(f"  {flight[0]} to {flight[1]} via {flight[2]}: €{flight[3]}")
+def round_trip_cost(departure, arrival):
+    """
+    Look up the price of a round-trip ticket, or None if it can't be bought.
+    """
+    if departure == 'AMS':
+        return round_trip_costs_AMS.get(arrival)
+    if departure == 'BLR':
+        return round_trip_costs_BLR.get(arrival)
+    return None
+
+
+def leg_lower_bound(departure, arrival):
+    """
+    Lower bound on what a leg contributes to the cost of any route.
+    A leg is either flown one-way, or it is one of the two legs of a round-trip ticket
+    that both have to be used, so it costs at least half of that ticket.
+    """
+    bound = one_way_costs[departure][arrival]
+    for ticket in (round_trip_cost(departure, arrival), round_trip_cost(arrival, departure)):
+        if ticket is not None:
+            bound = min(bound, ticket / 2)
+    return bound
+
+
+# Lower bounds on the legs, and on the cheapest leg leaving and returning
+leg_bounds = {(departure, arrival): leg_lower_bound(departure, arrival) for departure in cities for arrival in cities}
+intermediate_cities = [city for city in cities if city != start_city]
+min_leg_bound = {city: min(leg_bounds[city, arrival] for arrival in intermediate_cities if arrival != city)
+                 for city in cities}
+min_return_bound = min(leg_bounds[city, start_city] for city in intermediate_cities)
+
+
+def completion_lower_bound(city):
+    """
+    Lower bound on the cost of returning to the start city from the given city,
+    either directly or via at least one more city.
+    """
+    return min(leg_bounds[city, start_city], min_leg_bound[city] + min_return_bound)
+
+
+def enumerate_routes(prefix: Tuple[str, ...], min_length: int, max_length: int,
+                     incumbent: Callable[[], float]) -> Iterator[List[str]]:
+    """
+    Enumerate each distinct valid route exactly once, ordered by the number of intermediate cities.
+
+    Only routes whose intermediate cities start with the prefix are enumerated. Consecutive visits
+    to the same city are skipped, since such a leg doesn't exist. A prefix is pruned as soon as the
+    lower bound on its partial cost plus the cost of returning reaches the incumbent.
+
+    Args:
+        prefix (Tuple[str, ...]): The leading intermediate cities of the enumerated routes.
+        min_length (int): The minimum number of intermediate cities.
+        max_length (int): The maximum number of intermediate cities.
+        incumbent (Callable[[], float]): Returns the cost of the best route found so far.
+
+    Yields:
+        List[str]: The valid routes that may improve on the incumbent.
+    """
+    def extend(path, length, partial_bound):
+        last_city = path[-1]
+        if partial_bound + completion_lower_bound(last_city) >= incumbent():
+            return
+        remaining = length - (len(path) - 1)
+        # Check that the missing cities still fit in the remaining positions
+        missing = sum(city not in path for city in mandatory_cities)
+        if not any(city in path for city in optional_cities):
+            missing += 1
+        if missing > remaining:
+            return
+        if remaining == 0:
+            route = path + [start_city]
+            if is_valid_route(route):
+                yield route
+            return
+        for city in intermediate_cities:
+            if city != last_city:
+                yield from extend(path + [city], length, partial_bound + leg_bounds[last_city, city])
+
+    for length in range(max(min_length, len(prefix), 1), max_length + 1):
+        path = [start_city]
+        partial_bound = 0
+        valid_prefix = True
+        for city in prefix:
+            if city == path[-1]:
+                valid_prefix = False
+                break
+            partial_bound += leg_bounds[path[-1], city]
+            path.append(city)
+        if valid_prefix:
+            yield from extend(path, length, partial_bound)
+
+
+def split_chunks(depth: int = chunk_depth) -> List[Tuple[Tuple[str, ...], int]]:
+    """
+    Split the enumeration into chunks that can be searched independently.
+    Each chunk contains the routes starting with one sequence of `depth` intermediate cities,
+    and one extra chunk contains the routes with fewer intermediate cities.
+
+    Args:
+        depth (int): The number of leading intermediate cities that define a chunk.
+
+    Returns:
+        List[Tuple[Tuple[str, ...], int]]: The chunks as (prefix, minimum number of intermediate cities).
+    """
+    chunks = [((), 1)] if depth > 1 else []
+    for prefix in itertools.product(intermediate_cities, repeat=depth):
+        if all(prefix[i] != prefix[i + 1] for i in range(depth - 1)):
+            chunks.append((prefix, depth))
+    return chunks
+
+
+def init_worker(incumbent) -> None:
+    """
+    Keep the incumbent shared between the worker processes of a parallel exhaustive search.
+
+    Args:
+        incumbent (multiprocessing.Value): The best cost found by any worker.
+    """
+    global shared_incumbent
+    shared_incumbent = incumbent
+
+
+def search_chunk(chunk: Tuple[Tuple[str, ...], int], initial_cost: float = float('inf')):
+    """
+    Exhaustively search one chunk of the enumeration.
+    In a worker process, routes that can't beat the best cost found by any worker are pruned as well.
+
+    Args:
+        chunk (Tuple[Tuple[str, ...], int]): The prefix and minimum number of intermediate cities.
+        initial_cost (float): The cost of a known route, routes that can't beat it are pruned.
+
+    Returns:
+        Tuple[float, Optional[List[str]], Optional[list], int]: The best cost, route and flights
+            found in the chunk, and the number of evaluated routes.
+    """
+    prefix, min_length = chunk
+    max_length = max_intermediate_cities if prefix or chunk_depth <= 1 else chunk_depth - 1
+    chunk_best_cost, chunk_best_route, chunk_best_flights = initial_cost, None, None
+    evaluations = 0
+
+    def incumbent():
+        if shared_incumbent is None:
+            return chunk_best_cost
+        return min(chunk_best_cost, shared_incumbent.value)
+
+    for route in enumerate_routes(prefix, min_length, max_length, incumbent):
+        evaluations += 1
+        total_cost, flights = calculate_cost(route)
+        if total_cost < incumbent():
+            chunk_best_cost, chunk_best_route, chunk_best_flights = total_cost, route, flights
+            if shared_incumbent is not None:
+                with shared_incumbent.get_lock():
+                    shared_incumbent.value = min(shared_incumbent.value, total_cost)
+    return chunk_best_cost, chunk_best_route, chunk_best_flights, evaluations
+
+
+def exhaustive_search(workers: int = 1, initial_cost: float = float('inf')):
+    """
+    Find the optimal route by searching all chunks of the enumeration, in parallel if workers > 1.
+    The workers share the best cost found so far, so that every chunk is pruned with the best route of any chunk.
+
+    Args:
+        workers (int): The number of worker processes.
+        initial_cost (float): The cost of a known route, routes that can't beat it are pruned.
+
+    Returns:
+        Tuple[float, Optional[List[str]], Optional[list], int]: The best cost, route and flights,
+            and the total number of evaluated routes.
+    """
+    chunks = split_chunks()
+    if workers > 1:
+        incumbent = multiprocessing.Value('d', initial_cost)
+        with multiprocessing.Pool(workers, initializer=init_worker, initargs=(incumbent,)) as pool:
+            # One chunk per task, so that later chunks are pruned with the results of earlier ones
+            results = pool.starmap(search_chunk, [(chunk, initial_cost) for chunk in chunks], chunksize=1)
+    else:
+        # Searching sequentially, each chunk can be pruned with the best route of the chunks before
+        results = []
+        for chunk in chunks:
+            results.append(search_chunk(chunk, min([initial_cost] + [result[0] for result in results])))
+
+    evaluations = sum(result[3] for result in results)
+    found = [result for result in results if result[1] is not None]
+    if not found:
+        return initial_cost, None, None, evaluations
+    chunk_best_cost, chunk_best_route, chunk_best_flights, _ = min(found, key=lambda result: result[0])
+    return chunk_best_cost, chunk_best_route, chunk_best_flights, evaluations
+
+
+def random_search():
+    """
+    Sample random routes and keep the cheapest valid one.
+    Returns the number of evaluated routes.
+    """
+    global best_cost, best_route, best_flights
+    evaluations = 0
+    for _ in range(iterations):
+        route = generate_random_route()
+        if not is_valid_route(route):
+            continue
+        evaluations += 1
+        total_cost, flights = calculate_cost(route)
+        if total_cost < best_cost:
+            best_cost = total_cost
+            best_route = route.copy()
+            best_flights = flights.copy()
+    return evaluations
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Search the cheapest route exhaustively or by random sampling.")
+    parser.add_argument('--random', action='store_true', help="Sample random routes instead of enumerating all routes.")
+    parser.add_argument('--workers', type=int, default=1, help="The number of worker processes for the exhaustive search.")
+    args = parser.parse_args()
+
+    if args.random:
+        evaluations = random_search()
+    else:
+        best_cost, best_route, best_flights, evaluations = exhaustive_search(args.workers)
+    print(f"Evaluated {evaluations} routes")
+
+    # Output the best route and cost
+    print("Optimal Route:", ' -> '.join(best_route))
+    print(f"Total Cost: € {best_cost}")
+    print("Flight Details:")
+    for flight in best_flights:
+        print(f"  {flight[0]} to {flight[1]} via {flight[2]}: €{flight[3]}")
@@ -1,10 +1,13 @@
 import requests
+import argparse
 import re
 import random
 import time
 import os
 import json
-from typing import Dict, List
+from typing import Dict, Iterable, List, Optional
+
+import flight_store
 
 # List of cities
 cities = ['AMS', 'IXA', 'SGN', 'HAN', 'SIN', 'TPE']
@@ -13,196 +16,369 @@ cities = ['AMS', 'IXA', 'SGN', 'HAN', 'SIN', 'TPE']
 start_date = '2025-01-20'
 end_date = '2025-02-15'
 
-# Initialize dictionaries to store costs and flight details
+# Google Flights search page, can be pointed at a local server replaying recorded pages
+base_url = 'https://www.google.com/travel/flights'
+
+# Streaming Parameters
+chunk_size: int = 16 * 1024  # Bytes read from the response at a time
+max_labels_after_results: int = 50  # Consecutive labels without a flight after which the results have ended
+
+# Initialize dictionaries to store the cheapest costs, the flight details are kept in the flight store
 one_way_costs: Dict[str, Dict[str, int]] = {}
 round_trip_costs: Dict[str, Dict[str, int]] = {}
-one_way_flights: Dict[str, Dict[str, List[dict]]] = {}
-round_trip_flights: Dict[str, Dict[str, List[dict]]] = {}
 
-# Function to extract valid flights from the content
-def extract_valid_flights(content: str) -> List[dict]:
+# Filters applied at scrape time; every parsed flight is kept in the flight store regardless
+max_layovers: int = 1
+max_duration_minutes: int = 20 * 60
+earliest_departure_minutes: int = 7 * 60
+min_price: float = 25  # Cheaper prices are considered a mistake
+
+
+def parse_flights(content: str) -> List[dict]:
+    """
+    Parse every flight option in the content, without filtering.
+
+    Args:
+        content (str): The HTML of a Google Flights results page.
+
+    Returns:
+        List[dict]: The flights with their layovers, duration, departure time and price.
+    """
     # Find all flight options in the content
     flight_infos = re.findall(r'aria-label="(.*?)"', content)
-    valid_flights = []
+    flights = []
     for flight_info in flight_infos:
-        flight_data = {}
-        # Check for multiple layovers ('2 stops' or '3 stops')
-        layover_match = re.search(r'\b(\d+)\s?stop', flight_info, re.IGNORECASE)
-        if layover_match:
-            layovers = int(layover_match.group(1))
-            if layovers >= 2:
-                continue  # Skip flights with multiple layovers
-        else:
-            layovers = 0  # Non-stop flight
-        flight_data['layovers'] = layovers
-
-        # Check for total travel duration less than 20 hours
-        duration_match = re.search(r'Total duration (\d+)\s*hr\s*(\d+)?\s*min', flight_info)
-        if duration_match:
-            hours = int(duration_match.group(1))
-            minutes = int(duration_match.group(2) or 0)
-            total_minutes = hours * 60 + minutes
-            if total_minutes >= 20 * 60:
-                continue  # Skip flights with duration 20 hours or more
-        else:
-            continue  # Can't find duration, skip
-        flight_data['duration'] = f"{hours} hr {minutes} min"
-
-        # Check departure time not between midnight and 7 AM
-        departure_match = re.search(r'Leaves .* at (\d+):(\d+)\s*(AM|PM)', flight_info)
-        if departure_match:
-            dep_hour = int(departure_match.group(1))
-            dep_min = int(departure_match.group(2))
-            dep_period = departure_match.group(3)
-            flight_data['departure_time'] = f"{dep_hour}:{dep_min:02d} {dep_period}"
-            # Convert to 24-hour format
-            if dep_period.upper() == 'PM' and dep_hour != 12:
-                dep_hour += 12
-            elif dep_period.upper() == 'AM' and dep_hour == 12:
-                dep_hour = 0
-            if 0 <= dep_hour < 7:
-                continue  # Skip flights departing between midnight and 7 AM
-        else:
-            continue  # Can't find departure time, skip
-
-        # Extract the price
-        price_match = re.search(r'From\s*([0-9]+)\s*euros', flight_info)
-        if price_match:
-            price = float(price_match.group(1))
-            if price < 25:
-                price = 9999  # Consider it a mistake
+        flight_data = parse_flight(flight_info)
+        if flight_data is not None:
+            flights.append(flight_data)
+    return flights
+
+
+def parse_flight(flight_info: str) -> Optional[dict]:
+    """
+    Parse a single flight option from its aria-label.
+
+    Args:
+        flight_info (str): The aria-label describing the flight.
+
+    Returns:
+        Optional[dict]: The flight, or None if the label does not describe a complete flight.
+    """
+    flight_data = {}
+    # Count the layovers ('1 stop', '2 stops', ...)
+    layover_match = re.search(r'\b(\d+)\s?stop', flight_info, re.IGNORECASE)
+    if layover_match:
+        layovers = int(layover_match.group(1))
+    else:
+        layovers = 0  # Non-stop flight
+    flight_data['layovers'] = layovers
+
+    # Total travel duration
+    duration_match = re.search(r'Total duration (\d+)\s*hr\s*(\d+)?\s*min', flight_info)
+    if duration_match:
+        hours = int(duration_match.group(1))
+        minutes = int(duration_match.group(2) or 0)
+    else:
+        return None  # Can't find duration, skip
+    flight_data['duration'] = f"{hours} hr {minutes} min"
+    flight_data['duration_minutes'] = hours * 60 + minutes
+
+    # Departure time
+    departure_match = re.search(r'Leaves .* at (\d+):(\d+)\s*(AM|PM)', flight_info)
+    if departure_match:
+        dep_hour = int(departure_match.group(1))
+        dep_min = int(departure_match.group(2))
+        dep_period = departure_match.group(3)
+        flight_data['departure_time'] = f"{dep_hour}:{dep_min:02d} {dep_period}"
+        # Convert to 24-hour format
+        if dep_period.upper() == 'PM' and dep_hour != 12:
+            dep_hour += 12
+        elif dep_period.upper() == 'AM' and dep_hour == 12:
+            dep_hour = 0
+        flight_data['departure_minutes'] = dep_hour * 60 + dep_min
+    else:
+        return None  # Can't find departure time, skip
+
+    # Extract the price
+    price_match = re.search(r'From\s*([0-9]+)\s*euros', flight_info)
+    if price_match:
+        flight_data['price'] = float(price_match.group(1))
+    else:
+        return None  # Can't find price, skip
+
+    return flight_data
+
+
+class LabelExtractor:
+    """
+    Incrementally extract the aria-label attributes from an HTML page that arrives in chunks.
+    Only the text after the last complete label is buffered, so memory stays bounded by the chunk size
+    and the longest label, and the labels are the same as those found in the full page.
+    """
+
+    marker = 'aria-label="'
+    pattern = re.compile(r'aria-label="(.*?)"')
+
+    def __init__(self):
+        self.buffer = ''
+
+    def feed(self, chunk: str) -> List[str]:
+        """
+        Add a chunk of the page and extract the labels that are complete.
+
+        Args:
+            chunk (str): The next chunk of the page.
+
+        Returns:
+            List[str]: The complete labels in the order they appear.
+        """
+        self.buffer += chunk
+        labels = []
+        end = 0
+        for match in self.pattern.finditer(self.buffer):
+            labels.append(match.group(1))
+            end = match.end()
+        remainder = self.buffer[end:]
+
+        # Keep an unfinished label, or the end of the buffer in case the marker itself was split
+        start = remainder.rfind(self.marker)
+        if start != -1 and '\n' not in remainder[start:]:
+            self.buffer = remainder[start:]
         else:
-            continue  # Can't find price, skip
-        flight_data['price'] = price
+            self.buffer = remainder[-(len(self.marker) - 1):]
+        return labels
+
+
+def parse_flight_stream(chunks: Iterable[str]) -> List[dict]:
+    """
+    Parse the flight options from a page that arrives in chunks, and stop reading once the results have ended:
+    when max_labels_after_results consecutive labels after the first flight don't describe a flight.
+
+    The whole list of results is read, whatever the filters, since Google lists the best flights first and the
+    cheapest one can come later, and the flight store has to keep every flight. Only the rest of the page is
+    skipped, at the risk of missing a flight that follows more than max_labels_after_results other labels.
+
+    Args:
+        chunks (Iterable[str]): The chunks of the page.
+
+    Returns:
+        List[dict]: The flights parsed before reading stopped, without filtering.
+    """
+    extractor = LabelExtractor()
+    flights = []
+    labels_since_flight = 0
+    for chunk in chunks:
+        for flight_info in extractor.feed(chunk):
+            flight_data = parse_flight(flight_info)
+            if flight_data is None:
+                labels_since_flight += 1
+                if flights and labels_since_flight >= max_labels_after_results:
+                    return flights
+                continue
+            flights.append(flight_data)
+            labels_since_flight = 0
+    return flights
+
+
+def check_recording(path: str, chunk_sizes: Iterable[int] = (1, 1000, chunk_size)) -> bool:
+    """
+    Check that streaming a recorded results page parses the same flights as parsing the full page,
+    in chunks of several sizes so that the labels are split at different places.
+
+    Args:
+        path (str): The recorded page.
+        chunk_sizes (Iterable[int]): The chunk sizes to stream the page in, in characters.
 
+    Returns:
+        bool: True if every chunk size parsed the same flights as the full page.
+    """
+    with open(path, encoding='utf-8') as f:
+        content = f.read()
+    expected_flights = parse_flights(content)
+
+    for size in chunk_sizes:
+        chunks = (content[i:i + size] for i in range(0, len(content), size))
+        if parse_flight_stream(chunks) != expected_flights:
+            print(f"Streaming {path} in chunks of {size} characters parsed other flights than the full page")
+            return False
+    print(f"Streaming {path} parsed the same {len(expected_flights)} flights as the full page")
+    return True
+
+
+def filter_valid_flights(flights: List[dict]) -> List[dict]:
+    """
+    Apply the scrape-time filters to parsed flights.
+
+    Args:
+        flights (List[dict]): The parsed flights.
+
+    Returns:
+        List[dict]: The flights satisfying the layover, duration and departure time filters.
+    """
+    valid_flights = []
+    for flight_data in flights:
+        if flight_data['layovers'] > max_layovers:
+            continue  # Skip flights with multiple layovers
+        if flight_data['duration_minutes'] >= max_duration_minutes:
+            continue  # Skip flights with duration 20 hours or more
+        if flight_data['departure_minutes'] < earliest_departure_minutes:
+            continue  # Skip flights departing between midnight and 7 AM
+        if flight_data['price'] < min_price:
+            flight_data = dict(flight_data, price=9999)  # Consider it a mistake
         valid_flights.append(flight_data)
     return valid_flights
 
-# One-way flights between all cities
-for origin in cities:
-    one_way_costs[origin] = {}
-    one_way_flights[origin] = {}
-    for destination in cities:
-        if origin == destination:
-            one_way_costs[origin][destination] = 9999
-            one_way_flights[origin][destination] = []
-            continue
-
-        # Construct the URL for one-way flights
-        url = f'https://www.google.com/travel/flights?hl=en&q=Flights%20to%20{destination}%20from%20{origin}%20on%20{start_date}%20oneway'
-
-        try:
-            response = requests.get(url)
+
+def build_url(origin: str, destination: str, round_trip: bool = False) -> str:
+    """
+    Construct the Google Flights URL for a one-way or round-trip search.
+
+    Args:
+        origin (str): The departure city.
+        destination (str): The arrival city.
+        round_trip (bool): Whether to search round-trip tickets returning on the end date.
+
+    Returns:
+        str: The search URL.
+    """
+    if round_trip:
+        return f'{base_url}?hl=en&q=Flights%20to%20{destination}%20from%20{origin}%20on%20{start_date}%20through%20{end_date}'
+    return f'{base_url}?hl=en&q=Flights%20to%20{destination}%20from%20{origin}%20on%20{start_date}%20oneway'
+
+
+def fetch_flights(origin: str, destination: str, round_trip: bool = False) -> Optional[List[dict]]:
+    """
+    Fetch the valid flights for a route, sorted by price.
+    The page is streamed through the label extractor, and the download stops once the list of results has ended.
+
+    Args:
+        origin (str): The departure city.
+        destination (str): The arrival city.
+        round_trip (bool): Whether to fetch round-trip tickets instead of one-way flights.
+
+    Returns:
+        Optional[List[dict]]: The valid flights, cheapest first. Empty if none were found, None if the request failed.
+    """
+    trip_type = 'round-trip' if round_trip else 'one-way'
+    try:
+        with requests.get(build_url(origin, destination, round_trip), stream=True) as response:
             if response.status_code == 200:
-                content = response.text
-                valid_flights = extract_valid_flights(content)
-                if valid_flights:
-                    # Sort flights by price
-                    valid_flights.sort(key=lambda x: x['price'])
-                    min_price = valid_flights[0]['price']
-                    one_way_costs[origin][destination] = int(min_price)
-                    one_way_flights[origin][destination] = valid_flights
-                    print(f"\nOne-way flights from {origin} to {destination}:")
-                    for flight in valid_flights:
-                        print(f"Departure: {flight['departure_time']}, Duration: {flight['duration']}, "
-                              f"Layovers: {flight['layovers']}, Price: €{flight['price']}")
-                else:
-                    print(f"No valid flights found for one-way flight from {origin} to {destination}")
-                    one_way_costs[origin][destination] = 9999
-                    one_way_flights[origin][destination] = []
+                response.encoding = response.encoding or 'utf-8'
+                flights = parse_flight_stream(response.iter_content(chunk_size=chunk_size, decode_unicode=True))
             else:
-                print(f"Failed to retrieve content for one-way flight from {origin} to {destination}. Status code: {response.status_code}")
-                one_way_costs[origin][destination] = 9999
-                one_way_flights[origin][destination] = []
-        except requests.exceptions.RequestException as e:
-            print(f"An error occurred for one-way flight from {origin} to {destination}: {e}")
-            one_way_costs[origin][destination] = 9999
-            one_way_flights[origin][destination] = []
-
-        # Sleep randomly between 3-5 seconds
-        time.sleep(random.uniform(3, 5))
-
-# Round-trip flights between all cities
-for origin in cities:
-    round_trip_costs[origin] = {}
-    round_trip_flights[origin] = {}
-    for destination in cities:
-        if origin == destination:
-            round_trip_costs[origin][destination] = 9999
-            round_trip_flights[origin][destination] = []
-            continue
-
-        # Construct the URL for round-trip flights
-        url_return = f'https://www.google.com/travel/flights?hl=en&q=Flights%20to%20{destination}%20from%20{origin}%20on%20{start_date}%20through%20{end_date}'
-
-        try:
-            response = requests.get(url_return)
-            if response.status_code == 200:
-                content = response.text
-                valid_flights = extract_valid_flights(content)
-                if valid_flights:
-                    # Sort flights by price
-                    valid_flights.sort(key=lambda x: x['price'])
-                    min_price = valid_flights[0]['price']
-                    round_trip_costs[origin][destination] = int(min_price)
-                    round_trip_flights[origin][destination] = valid_flights
-                    print(f"\nRound-trip flights from {origin} to {destination}:")
-                    for flight in valid_flights:
-                        print(f"Departure: {flight['departure_time']}, Duration: {flight['duration']}, "
-                              f"Layovers: {flight['layovers']}, Price: €{flight['price']}")
-                else:
-                    print(f"No valid flights found for round-trip flight from {origin} to {destination}")
-                    round_trip_costs[origin][destination] = 9999
-                    round_trip_flights[origin][destination] = []
+                flights = None
+        if flights is not None:
+            # Keep every parsed flight, so that the filters can be changed without scraping again
+            flight_store.store_flights(origin, destination, round_trip, start_date, end_date if round_trip else None,
+                                       flights)
+            valid_flights = filter_valid_flights(flights)
+            if valid_flights:
+                # Sort flights by price
+                valid_flights.sort(key=lambda x: x['price'])
+                print(f"\n{trip_type.capitalize()} flights from {origin} to {destination}:")
+                for flight in valid_flights:
+                    print(f"Departure: {flight['departure_time']}, Duration: {flight['duration']}, "
+                          f"Layovers: {flight['layovers']}, Price: €{flight['price']}")
             else:
-                print(f"Failed to retrieve content for round-trip flight from {origin} to {destination}. Status code: {response.status_code}")
-                round_trip_costs[origin][destination] = 9999
-                round_trip_flights[origin][destination] = []
-        except requests.exceptions.RequestException as e:
-            print(f"An error occurred for round-trip flight from {origin} to {destination}: {e}")
-            round_trip_costs[origin][destination] = 9999
-            round_trip_flights[origin][destination] = []
-
-        # Sleep randomly between 3-5 seconds
-        time.sleep(random.uniform(3, 5))
-
-# Output the results
-print("\nOne-way flight costs:")
-for origin, destinations in one_way_costs.items():
-    print(f"{origin}: {destinations}")
-
-print("\nRound-trip flight costs:")
-for origin, destinations in round_trip_costs.items():
-    print(f"{origin}: {destinations}")
-
-# --------------------------------------------
-# Saving the dictionaries to the 'data' folder
-# --------------------------------------------
-
-# Specify the path to your 'data' folder
-data_folder = 'data'
-
-# Create the 'data' folder if it doesn't exist
-if not os.path.exists(data_folder):
-    os.makedirs(data_folder)
-
-# Save the one_way_costs dictionary to a JSON file
-one_way_costs_file_path = os.path.join(data_folder, 'one_way_costs.json')
-with open(one_way_costs_file_path, 'w') as f:
-    json.dump(one_way_costs, f, indent=4)
-
-# Save the round_trip_costs dictionary to a JSON file
-round_trip_costs_file_path = os.path.join(data_folder, 'round_trip_costs.json')
-with open(round_trip_costs_file_path, 'w') as f:
-    json.dump(round_trip_costs, f, indent=4)
-
-# Save the detailed flight information to JSON files
-one_way_flights_file_path = os.path.join(data_folder, 'one_way_flights.json')
-with open(one_way_flights_file_path, 'w') as f:
-    json.dump(one_way_flights, f, indent=4)
-
-round_trip_flights_file_path = os.path.join(data_folder, 'round_trip_flights.json')
-with open(round_trip_flights_file_path, 'w') as f:
-    json.dump(round_trip_flights, f, indent=4)
-
-print("\nDictionaries have been saved to the 'data' folder.")
+                print(f"No valid flights found for {trip_type} flight from {origin} to {destination}")
+            return valid_flights
+        else:
+            print(f"Failed to retrieve content for {trip_type} flight from {origin} to {destination}. Status code: {response.status_code}")
+    except requests.exceptions.RequestException as e:
+        print(f"An error occurred for {trip_type} flight from {origin} to {destination}: {e}")
+    return None
+
+
+def fetch_cheapest_price(origin: str, destination: str, round_trip: bool = False) -> Optional[int]:
+    """
+    Fetch the price of the cheapest valid flight for a route.
+
+    Args:
+        origin (str): The departure city.
+        destination (str): The arrival city.
+        round_trip (bool): Whether to fetch round-trip tickets instead of one-way flights.
+
+    Returns:
+        Optional[int]: The cheapest price, 9999 if no valid flight was found, or None if the request failed.
+    """
+    if origin == destination:
+        return 9999
+    valid_flights = fetch_flights(origin, destination, round_trip)
+    if valid_flights is None:
+        return None
+    if valid_flights:
+        return int(valid_flights[0]['price'])
+    return 9999
+
+
+def scrape_all_routes() -> None:
+    """
+    Fetch one-way and round-trip flights between all ordered pairs of cities.
+    """
+    for costs, round_trip in ((one_way_costs, False), (round_trip_costs, True)):
+        for origin in cities:
+            costs[origin] = {}
+            for destination in cities:
+                if origin == destination:
+                    costs[origin][destination] = 9999
+                    continue
+
+                price = fetch_cheapest_price(origin, destination, round_trip)
+                costs[origin][destination] = 9999 if price is None else price
+
+                # Sleep randomly between 3-5 seconds
+                time.sleep(random.uniform(3, 5))
+
+
+def save_results() -> None:
+    """
+    Print the scraped costs and save them to the 'data' folder.
+    """
+    # Output the results
+    print("\nOne-way flight costs:")
+    for origin, destinations in one_way_costs.items():
+        print(f"{origin}: {destinations}")
+
+    print("\nRound-trip flight costs:")
+    for origin, destinations in round_trip_costs.items():
+        print(f"{origin}: {destinations}")
+
+    # --------------------------------------------
+    # Saving the dictionaries to the 'data' folder
+    # --------------------------------------------
+
+    # Specify the path to your 'data' folder
+    data_folder = 'data'
+
+    # Create the 'data' folder if it doesn't exist
+    if not os.path.exists(data_folder):
+        os.makedirs(data_folder)
+
+    # Save the one_way_costs dictionary to a JSON file
+    one_way_costs_file_path = os.path.join(data_folder, 'one_way_costs.json')
+    with open(one_way_costs_file_path, 'w') as f:
+        json.dump(one_way_costs, f, indent=4)
+
+    # Save the round_trip_costs dictionary to a JSON file
+    round_trip_costs_file_path = os.path.join(data_folder, 'round_trip_costs.json')
+    with open(round_trip_costs_file_path, 'w') as f:
+        json.dump(round_trip_costs, f, indent=4)
+
+    print("\nDictionaries have been saved to the 'data' folder, flight details to the flight store.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape one-way and round-trip flights between all cities.")
+    parser.add_argument('--base-url', default=base_url,
+                        help="The flight search page, e.g. a local server replaying recorded pages.")
+    parser.add_argument('--check-recording', metavar='PATH',
+                        help="Only check that streaming a recorded page parses the same flights as the full page.")
+    args = parser.parse_args()
+    base_url = args.base_url
+
+    if args.check_recording:
+        if not check_recording(args.check_recording):
+            raise SystemExit(1)
+    else:
+        scrape_all_routes()
+        save_results()
@@ -0,0 +1,278 @@
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Set, Tuple
+import argparse
+import hashlib
+import json
+import math
+import threading
+
+import memetic_algorithm
+from engines import ENGINES
+from evaluator import RouteEvaluator, build_adjacency, missing_price
+
+# Daemon Parameters
+host: str = '127.0.0.1'  # Only accept local connections
+port: int = 8765
+worker_count: int = 4
+cache_size: int = 1000  # Number of query results kept in the cache
+default_engine: str = 'tabu'
+default_time_limit: float = 0.5  # Seconds per query
+max_time_limit: float = 60.0  # Longer time limits are capped, so that no query holds a worker for long
+
+# Costs resident in every worker process
+worker_one_way_costs: Dict[str, Dict[str, int]] = {}
+worker_round_trip_costs: Dict[str, Dict[str, int]] = {}
+worker_adjacency: Optional[Tuple[Dict[str, Set[str]], Set[Tuple[str, str]]]] = None
+
+
+def init_worker(one_way_costs: Dict[str, Dict[str, int]], round_trip_costs: Dict[str, Dict[str, int]]) -> None:
+    """
+    Keep the costs and their adjacency resident in a worker process, so that queries do not build them again.
+
+    Args:
+        one_way_costs (Dict[str, Dict[str, int]]): The one-way costs.
+        round_trip_costs (Dict[str, Dict[str, int]]): The round-trip costs.
+    """
+    global worker_one_way_costs, worker_round_trip_costs, worker_adjacency
+    worker_one_way_costs = one_way_costs
+    worker_round_trip_costs = round_trip_costs
+    worker_adjacency = build_adjacency(one_way_costs, round_trip_costs)
+
+
+def solve(query: dict) -> dict:
+    """
+    Solve a trip query in a worker process.
+
+    Args:
+        query (dict): The normalized query, see normalize_query.
+
+    Returns:
+        dict: The best route, its cost and the flight details.
+
+    Raises:
+        ValueError: If no route without missing flights was found.
+    """
+    evaluator = RouteEvaluator(worker_one_way_costs, worker_round_trip_costs, query['origin_cities'],
+                               query['destination_cities'], query['mandatory_cities'], query['optional_cities'],
+                               worker_adjacency)
+    engine = ENGINES[query['engine']](evaluator, time_limit=query['time_limit'])
+    route, cost = engine.run()
+    if route is None or cost >= missing_price:
+        raise ValueError("No feasible route found, every route found uses a flight that doesn't exist")
+    return {'route': route, 'cost': cost, 'flights': evaluator.flights(route)}
+
+
+def normalize_query(query: dict, cities: set) -> dict:
+    """
+    Validate a trip query and bring it in a canonical form, so that equivalent queries share a cache entry.
+    A query either has a start_city where the trip starts and ends, or lists of origin_cities and
+    destination_cities, where destination_cities defaults to origin_cities.
+
+    Args:
+        query (dict): The query with start_city or origin_cities and destination_cities, mandatory_cities,
+            optional_cities and optionally engine and time_limit.
+        cities (set): The cities with known costs.
+
+    Returns:
+        dict: The normalized query.
+
+    Raises:
+        ValueError: If the query is invalid.
+    """
+    try:
+        origin_cities = [query['start_city']] if 'start_city' in query else query['origin_cities']
+        normalized = {
+            'origin_cities': sorted(set(map(str, origin_cities))),
+            'destination_cities': sorted(set(map(str, query.get('destination_cities', origin_cities)))),
+            'mandatory_cities': sorted(set(map(str, query['mandatory_cities']))),
+            'optional_cities': sorted(set(map(str, query['optional_cities']))),
+            'engine': str(query.get('engine', default_engine)),
+            'time_limit': float(query.get('time_limit', default_time_limit)),
+        }
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid query: {e}")
+
+    unknown_cities = (set(normalized['origin_cities']) | set(normalized['destination_cities'])
+                      | set(normalized['mandatory_cities']) | set(normalized['optional_cities'])) - cities
+    if unknown_cities:
+        raise ValueError(f"No costs known for {', '.join(sorted(unknown_cities))}")
+    if not normalized['origin_cities'] or not normalized['destination_cities']:
+        raise ValueError("At least one origin and one destination city is required")
+    if not normalized['optional_cities']:
+        raise ValueError("At least one optional city is required")
+    overlapping_cities = ((set(normalized['origin_cities']) | set(normalized['destination_cities']))
+                          & (set(normalized['mandatory_cities']) | set(normalized['optional_cities'])))
+    overlapping_cities |= set(normalized['mandatory_cities']) & set(normalized['optional_cities'])
+    if overlapping_cities:
+        raise ValueError(f"Cities can't have more than one role: {', '.join(sorted(overlapping_cities))}")
+    if normalized['engine'] not in ENGINES:
+        raise ValueError(f"Unknown engine {normalized['engine']}, choose from {', '.join(ENGINES)}")
+    if not math.isfinite(normalized['time_limit']) or normalized['time_limit'] <= 0:
+        raise ValueError("The time limit must be a positive number")
+    normalized['time_limit'] = min(normalized['time_limit'], max_time_limit)
+    return normalized
+
+
+class SolverDaemon:
+    """
+    Keep the costs resident in a pool of worker processes and answer trip queries,
+    caching the results by query and data version.
+
+    Args:
+        one_way_costs (Dict[str, Dict[str, int]]): The one-way costs.
+        round_trip_costs (Dict[str, Dict[str, int]]): The round-trip costs.
+    """
+
+    def __init__(self, one_way_costs: Dict[str, Dict[str, int]], round_trip_costs: Dict[str, Dict[str, int]]):
+        self.lock = threading.Lock()
+        self.cache: 'OrderedDict[Tuple[str, str], dict]' = OrderedDict()
+        self.pending: Dict[Tuple[str, str], Future] = {}
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.load(one_way_costs, round_trip_costs)
+
+    def load(self, one_way_costs: Dict[str, Dict[str, int]], round_trip_costs: Dict[str, Dict[str, int]]) -> None:
+        """
+        Load new costs into a fresh worker pool. Cached results of earlier data versions are no longer used.
+
+        Args:
+            one_way_costs (Dict[str, Dict[str, int]]): The one-way costs.
+            round_trip_costs (Dict[str, Dict[str, int]]): The round-trip costs.
+        """
+        data = json.dumps([one_way_costs, round_trip_costs], sort_keys=True)
+        executor = ProcessPoolExecutor(max_workers=worker_count, initializer=init_worker,
+                                       initargs=(one_way_costs, round_trip_costs))
+        with self.lock:
+            previous_executor = self.executor
+            self.executor = executor
+            self.cities = set(round_trip_costs)
+            self.data_version = hashlib.sha1(data.encode()).hexdigest()[:12]
+        if previous_executor is not None:
+            previous_executor.shutdown(wait=False)
+
+    def submit(self, query: dict) -> Tuple[dict, bool]:
+        """
+        Answer a query from the cache, or queue it on the worker pool. Identical queries that arrive
+        while one is being solved wait for the same result.
+
+        Args:
+            query (dict): The trip query.
+
+        Returns:
+            Tuple[dict, bool]: The result and whether it came from the cache.
+
+        Raises:
+            ValueError: If the query is invalid or has no feasible route.
+            RuntimeError: If solving the query failed in the worker pool.
+        """
+        with self.lock:
+            query = normalize_query(query, self.cities)
+            key = (json.dumps(query, sort_keys=True), self.data_version)
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key], True
+            future = self.pending.get(key)
+            if future is None:
+                future = self.executor.submit(solve, query)
+                self.pending[key] = future
+
+        try:
+            result = dict(future.result(), data_version=key[1])
+        except ValueError:
+            raise
+        except Exception as e:
+            # Raised in the worker, or the worker pool broke down
+            raise RuntimeError(f"Solving failed: {e!r}") from e
+        finally:
+            with self.lock:
+                self.pending.pop(key, None)
+        with self.lock:
+            self.cache[key] = result
+            while len(self.cache) > cache_size:
+                self.cache.popitem(last=False)
+        return result, False
+
+    def status(self) -> dict:
+        """
+        Returns:
+            dict: The data version, the number of cached results and the number of queries being solved.
+        """
+        with self.lock:
+            return {'data_version': self.data_version, 'cached': len(self.cache), 'pending': len(self.pending)}
+
+
+class SolverRequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP API of the solver daemon:
+    - POST /solve with a JSON trip query returns the best route
+    - POST /reload loads the costs again, after the scraper refreshed them
+    - GET /status returns the data version and the cache and queue sizes
+    """
+
+    solver: SolverDaemon
+    load_costs: Callable[[], Tuple[Dict[str, Dict[str, int]], Dict[str, Dict[str, int]]]]
+
+    def send_json(self, status: int, body: dict) -> None:
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self) -> None:
+        if self.path == '/status':
+            self.send_json(200, self.solver.status())
+        else:
+            self.send_json(404, {'error': f"Unknown path {self.path}"})
+
+    def do_POST(self) -> None:
+        if self.path == '/reload':
+            try:
+                self.solver.load(*self.load_costs())
+            except Exception as e:
+                self.send_json(500, {'error': f"Reloading the costs failed: {e!r}"})
+                return
+            self.send_json(200, self.solver.status())
+            return
+        if self.path != '/solve':
+            self.send_json(404, {'error': f"Unknown path {self.path}"})
+            return
+        try:
+            query = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            result, cached = self.solver.submit(query)
+        except (ValueError, AttributeError) as e:
+            self.send_json(400, {'error': str(e)})
+            return
+        except Exception as e:
+            self.send_json(500, {'error': str(e)})
+            return
+        self.send_json(200, dict(result, cached=cached))
+
+    def log_message(self, format: str, *args) -> None:
+        pass  # Keep the console quiet for every request
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Answer trip queries from a local solver daemon.")
+    parser.add_argument('--port', type=int, default=port, help="The local port to listen on.")
+    parser.add_argument('--database', metavar='PATH',
+                        help="Build the costs from the flight store written by the scraper, e.g. data/flights.db.")
+    args = parser.parse_args()
+
+    def load_costs() -> Tuple[Dict[str, Dict[str, int]], Dict[str, Dict[str, int]]]:
+        if args.database:
+            memetic_algorithm.load_costs_from_store(args.database)
+        else:
+            memetic_algorithm.load_costs()
+        return memetic_algorithm.one_way_costs, memetic_algorithm.round_trip_costs
+
+    SolverRequestHandler.load_costs = staticmethod(load_costs)
+    SolverRequestHandler.solver = SolverDaemon(*load_costs())
+    server = ThreadingHTTPServer((host, args.port), SolverRequestHandler)
+    print(f"Solver daemon listening on http://{host}:{args.port} (data version {SolverRequestHandler.solver.data_version})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()